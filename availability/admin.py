@@ -1,9 +1,30 @@
 from django.contrib import admin
-from .models import TimeSlot
+from hms.paginator import EstimatedCountPaginator
+from .models import TimeSlot, RecurringSchedule, DoctorDailySummary
 
 
 @admin.register(TimeSlot)
 class TimeSlotAdmin(admin.ModelAdmin):
-    list_display = ('doctor', 'start', 'end', 'is_booked')
-    list_filter = ('is_booked', 'doctor')
+    list_display = ('doctor', 'start', 'end', 'is_booked', 'blocked')
+    list_select_related = ('doctor',)
+    list_filter = ('is_booked', 'blocked', 'doctor')
+    search_fields = ('doctor__username',)
+    date_hierarchy = 'start'
+    raw_id_fields = ('doctor',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(RecurringSchedule)
+class RecurringScheduleAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'start_time', 'end_time', 'slot_minutes', 'valid_from', 'valid_until', 'generated_until')
+    list_select_related = ('doctor',)
+    search_fields = ('doctor__username',)
+
+
+@admin.register(DoctorDailySummary)
+class DoctorDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'day', 'slots_published', 'slots_booked', 'utilization', 'updated_at')
+    list_select_related = ('doctor',)
+    list_filter = ('day',)
     search_fields = ('doctor__username',)
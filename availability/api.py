@@ -0,0 +1,83 @@
+"""Read-only JSON API for doctors and their free slots."""
+import orjson
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from hms.db_router import use_replica
+from .directory import EARLIEST_LIMIT, earliest_free_slots
+from .models import TimeSlot
+from .pagination import keyset_page, parse_limit, parse_moment
+
+SLOT_FIELDS = ('id', 'doctor_id', 'start', 'end')
+
+
+def json_response(payload, status=200):
+    """Serialize with orjson, which encodes datetimes natively."""
+    return HttpResponse(orjson.dumps(payload), status=status, content_type='application/json')
+
+
+def bad_request(message):
+    return json_response({'error': message}, status=400)
+
+
+@require_GET
+@use_replica()
+def doctors(request):
+    """GET /api/doctors/?after=<id>&limit=N -- doctors ordered by id."""
+    from users.models import User
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        after = int(request.GET.get('after') or 0)
+    except ValueError as exc:
+        return bad_request(str(exc))
+    rows = list(
+        User.objects.filter(role=User.DOCTOR, id__gt=after)
+        .order_by('id')
+        .values('id', 'username', 'first_name', 'last_name')[:limit + 1]
+    )
+    next_after = rows[limit - 1]['id'] if len(rows) > limit else None
+    return json_response({'results': rows[:limit], 'next': next_after})
+
+
+@require_GET
+@use_replica()
+def free_slots(request):
+    """GET /api/slots/?doctor=<id>&from=&to=&cursor=&limit=N -- free slots ordered by (start, id).
+
+    `from` defaults to now; pass `next` back as `cursor` to fetch the
+    following page.
+    """
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        start_from = parse_moment(request.GET.get('from')) or timezone.now()
+        start_to = parse_moment(request.GET.get('to'))
+        doctor_id = int(request.GET['doctor']) if request.GET.get('doctor') else None
+    except ValueError as exc:
+        return bad_request(str(exc))
+
+    slots = TimeSlot.objects.filter(is_booked=False, blocked=False, start__gte=start_from)
+    if start_to:
+        slots = slots.filter(start__lt=start_to)
+    if doctor_id:
+        slots = slots.filter(doctor_id=doctor_id)
+    try:
+        rows, next_cursor = keyset_page(
+            slots.values(*SLOT_FIELDS), request.GET.get('cursor'), limit,
+        )
+    except ValueError as exc:
+        return bad_request(str(exc))
+    return json_response({'results': rows, 'next': next_cursor})
+
+
+@require_GET
+@use_replica()
+def earliest_slots(request):
+    """GET /api/slots/earliest/?from=&to=&limit=K -- the K soonest free slots with any doctor."""
+    try:
+        limit = parse_limit(request.GET.get('limit'), default=EARLIEST_LIMIT)
+        start_from = parse_moment(request.GET.get('from'))
+        start_to = parse_moment(request.GET.get('to'))
+    except ValueError as exc:
+        return bad_request(str(exc))
+    rows = list(earliest_free_slots(start_from, start_to, limit).values(*SLOT_FIELDS))
+    return json_response({'results': rows})
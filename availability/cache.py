@@ -0,0 +1,129 @@
+"""Versioned read-through cache for each doctor's next free slots.
+
+Every doctor has a version key holding the time of the last change to
+their slots. Cached slot lists are stored under a key that embeds the
+version, so bumping the version (on commit of a slot or booking change)
+invalidates in O(1) without deleting anything; stale entries simply age
+out.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from hms.db_router import use_primary
+
+SLOTS_TIMEOUT = settings.AVAILABILITY_CACHE_SECONDS
+# How long a recomputation may hold its single-flight lock, and how long
+# other callers wait for it before computing themselves.
+LOCK_TIMEOUT = 10
+WAIT_SECONDS = 1.0
+POLL_SECONDS = 0.02
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.computed = self.waited = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'computed': self.computed, 'waited': self.waited}
+
+
+stats = CacheStats()
+
+
+def version_key(doctor_id):
+    return f'availability:version:{doctor_id}'
+
+
+def slots_key(doctor_id, version, limit):
+    return f'availability:slots:{doctor_id}:{version}:{limit}'
+
+
+def get_versions(doctor_ids):
+    """Return {doctor_id: version}, creating versions that are not cached yet."""
+    keys = {version_key(d): d for d in doctor_ids}
+    found = cache.get_many(keys)
+    missing = [k for k in keys if k not in found]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[k]: v for k, v in found.items()}
+
+
+def bump_version(doctor_id):
+    cache.set(version_key(doctor_id), time.time_ns(), timeout=None)
+
+
+def invalidate_doctor(doctor_id):
+    """Invalidate a doctor's cached availability once the current transaction commits."""
+    transaction.on_commit(lambda: bump_version(doctor_id))
+
+
+def version_timestamp(version):
+    """Unix time (seconds) of the change that produced `version`."""
+    return version // 1_000_000_000
+
+
+def cached_free_slots(doctor_ids, limit, versions=None):
+    """Read-through equivalent of directory.next_free_slots().
+
+    Misses are recomputed together in one windowed query. Each missing
+    entry is guarded by a cache.add() lock so that concurrent callers (in
+    this or other processes) wait for a single recomputation instead of
+    stampeding the database.
+    """
+    from .directory import next_free_slots
+    doctor_ids = list(doctor_ids)
+    if versions is None:
+        versions = get_versions(doctor_ids)
+    keys = {d: slots_key(d, versions[d], limit) for d in doctor_ids}
+    found = cache.get_many(keys.values())
+    result = {d: found[keys[d]] for d in doctor_ids if keys[d] in found}
+    missing = [d for d in doctor_ids if d not in result]
+    stats.add(hits=len(result), misses=len(missing))
+
+    if missing:
+        owned = [d for d in missing if cache.add(f'{keys[d]}:lock', 1, timeout=LOCK_TIMEOUT)]
+        waiting = [d for d in missing if d not in owned]
+        if owned:
+            # Shared entries are filled from the primary: a lagging replica
+            # would cache pre-change slots under the new version.
+            with use_primary():
+                computed = next_free_slots(owned, limit)
+            cache.set_many({keys[d]: computed[d] for d in owned}, timeout=SLOTS_TIMEOUT)
+            cache.delete_many([f'{keys[d]}:lock' for d in owned])
+            result.update(computed)
+            stats.add(computed=len(owned))
+        if waiting:
+            deadline = time.monotonic() + WAIT_SECONDS
+            while waiting and time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+                arrived = cache.get_many([keys[d] for d in waiting])
+                for d in list(waiting):
+                    if keys[d] in arrived:
+                        result[d] = arrived[keys[d]]
+                        waiting.remove(d)
+            stats.add(waited=len(missing) - len(owned) - len(waiting))
+            if waiting:
+                # The lock holder is slow or died; don't block the request on it.
+                result.update(next_free_slots(waiting, limit))
+                stats.add(computed=len(waiting))
+
+    # Cached lists can outlive a slot's start time; drop slots now in the past.
+    now = timezone.now()
+    return {d: [s for s in result[d] if s.start > now] for d in doctor_ids}
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .models import TimeSlot
+
+DOCTORS_PER_PAGE = 20
+SLOTS_PER_DOCTOR = 10
+
+# One COUNT for the paginator, one for the page of doctors, one windowed
+# query for all of their slots -- independent of how many doctors exist.
+# With a warm availability cache the slot query is skipped entirely.
+DIRECTORY_QUERY_BUDGET = 3
+
+EARLIEST_LIMIT = 10
+
+
+def ranked_free_slots(doctor_ids, limit=SLOTS_PER_DOCTOR):
+    """Queryset of the next `limit` free slots for each of `doctor_ids`.
+
+    Uses a ROW_NUMBER() window partitioned by doctor so a whole page of
+    doctors is served by a single query instead of one query per doctor.
+    """
+    return (
+        TimeSlot.objects
+        .filter(doctor_id__in=doctor_ids, is_booked=False, blocked=False, start__gt=timezone.now())
+        .annotate(rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('doctor_id')],
+            order_by=[F('start').asc(), F('id').asc()],
+        ))
+        .filter(rank__lte=limit)
+        .order_by('doctor_id', 'start', 'id')
+    )
+
+
+def earliest_free_slots(window_start=None, window_end=None, limit=EARLIEST_LIMIT):
+    """Queryset of the `limit` earliest free slots across all doctors.
+
+    Ordered by (start, id) so the database walks the partial
+    `timeslot_free_start_id_idx` index from `window_start` and stops after
+    `limit` rows; the cost depends on K, not on the number of doctors.
+    """
+    now = timezone.now()
+    window_start = max(window_start, now) if window_start else now
+    slots = TimeSlot.objects.filter(is_booked=False, blocked=False, start__gt=window_start)
+    if window_end:
+        slots = slots.filter(start__lt=window_end)
+    return slots.order_by('start', 'id')[:limit]
+
+
+def next_free_slots(doctor_ids, limit=SLOTS_PER_DOCTOR):
+    """Return {doctor_id: [TimeSlot, ...]} for every id in `doctor_ids`."""
+    doctor_ids = list(doctor_ids)
+    if not doctor_ids:
+        return {}
+    slots = {doctor_id: [] for doctor_id in doctor_ids}
+    for slot in ranked_free_slots(doctor_ids, limit):
+        slots[slot.doctor_id].append(slot)
+    return slots
+
+
+def doctor_directory(page_number=None, per_page=DOCTORS_PER_PAGE, slots_per_doctor=SLOTS_PER_DOCTOR):
+    """Return a Page of {'doctor': User, 'slots': [...], 'version': int} entries.
+
+    `version` is the doctor's availability cache version; it changes
+    whenever one of their slots or bookings does.
+    """
+    page = Paginator(_doctors(), per_page).get_page(page_number)
+    return _fill_page(page, list(page.object_list), slots_per_doctor)
+
+
+async def adoctor_directory(page_number=None, per_page=DOCTORS_PER_PAGE, slots_per_doctor=SLOTS_PER_DOCTOR):
+    """doctor_directory() for async views; the doctor page is read with the async ORM."""
+    doctors_qs = _doctors()
+    paginator = Paginator(doctors_qs, per_page)
+    paginator.count = await doctors_qs.acount()
+    page = paginator.get_page(page_number)
+    doctors = [d async for d in page.object_list]
+    return await sync_to_async(_fill_page)(page, doctors, slots_per_doctor)
+
+
+def _doctors():
+    from users.models import User
+    return User.objects.filter(role=User.DOCTOR).order_by('username', 'id')
+
+
+def _fill_page(page, doctors, slots_per_doctor):
+    from .cache import cached_free_slots, get_versions
+    versions = get_versions([d.id for d in doctors])
+    slots = cached_free_slots([d.id for d in doctors], slots_per_doctor, versions=versions)
+    page.object_list = [{'doctor': d, 'slots': slots[d.id], 'version': versions[d.id]} for d in doctors]
+    return page
+
+
+@contextmanager
+def assert_max_queries(limit, using=DEFAULT_DB_ALIAS):
+    """Raise AssertionError if the wrapped block runs more than `limit` queries."""
+    with CaptureQueriesContext(connections[using]) as ctx:
+        yield ctx
+    if len(ctx) > limit:
+        statements = '\n'.join(q['sql'] for q in ctx.captured_queries)
+        raise AssertionError(f'{len(ctx)} queries executed, budget is {limit}:\n{statements}')
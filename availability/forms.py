@@ -1,5 +1,6 @@
 from django import forms
-from .models import TimeSlot
+from django.db import connection
+from .models import TimeSlot, RecurringSchedule, OVERLAP_MESSAGE
 
 
 class TimeSlotForm(forms.ModelForm):
@@ -7,10 +8,46 @@ class TimeSlotForm(forms.ModelForm):
         model = TimeSlot
         fields = ['start', 'end']
 
+    def __init__(self, *args, doctor=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.doctor = doctor
+
     def clean(self):
         cleaned = super().clean()
         start = cleaned.get('start')
         end = cleaned.get('end')
         if start and end and end <= start:
             raise forms.ValidationError('End time must be after start time')
+        # On PostgreSQL the exclusion constraint rejects overlaps at insert
+        # time (see create_slot); other backends need the explicit check.
+        if (self.doctor and start and end and connection.vendor != 'postgresql'
+                and TimeSlot.overlapping(self.doctor, start, end).exists()):
+            raise forms.ValidationError(OVERLAP_MESSAGE)
+        return cleaned
+
+
+class RecurringScheduleForm(forms.ModelForm):
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=RecurringSchedule.WEEKDAY_CHOICES,
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple,
+    )
+
+    class Meta:
+        model = RecurringSchedule
+        fields = ['weekdays', 'start_time', 'end_time', 'slot_minutes', 'valid_from', 'valid_until']
+
+    def clean(self):
+        cleaned = super().clean()
+        start_time = cleaned.get('start_time')
+        end_time = cleaned.get('end_time')
+        if start_time and end_time and end_time <= start_time:
+            raise forms.ValidationError('End time must be after start time')
+        valid_from = cleaned.get('valid_from')
+        valid_until = cleaned.get('valid_until')
+        if valid_from and valid_until and valid_until < valid_from:
+            raise forms.ValidationError('End date must not be before start date')
+        slot_minutes = cleaned.get('slot_minutes')
+        if slot_minutes is not None and slot_minutes < 5:
+            raise forms.ValidationError('Slots must be at least 5 minutes long')
         return cleaned
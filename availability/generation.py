@@ -0,0 +1,95 @@
+import logging
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import TimeSlot, RecurringSchedule
+from .intervals import split_overlapping
+from .cache import invalidate_doctor
+from .signals import publish_slots
+from .summary import rebuild as rebuild_summaries
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_DAYS = 90
+# Days generated while the doctor waits on a new schedule; the
+# generate_slots command extends it to DEFAULT_HORIZON_DAYS.
+PUBLISH_HORIZON_DAYS = 14
+BATCH_SIZE = 500
+
+
+def iter_schedule_slots(schedule, first_day, last_day):
+    """Yield (start, end) for every slot the schedule defines between two dates, inclusive."""
+    step = timedelta(minutes=schedule.slot_minutes)
+    weekdays = set(schedule.weekdays)
+    day = first_day
+    while day <= last_day:
+        if day.weekday() in weekdays:
+            start = timezone.make_aware(datetime.combine(day, schedule.start_time))
+            day_end = timezone.make_aware(datetime.combine(day, schedule.end_time))
+            while start + step <= day_end:
+                yield start, start + step
+                start += step
+        day += timedelta(days=1)
+
+
+def materialize_schedule(schedule, until=None, batch_size=BATCH_SIZE):
+    """Create the schedule's missing slots up to `until` and return how many were created.
+
+    Only days after `generated_until` are considered and candidates that
+    overlap a slot the doctor already has are skipped, so the call is safe
+    to repeat; slots are inserted with chunked bulk_create in one transaction.
+    """
+    today = timezone.localdate()
+    if until is None:
+        until = today + timedelta(days=DEFAULT_HORIZON_DAYS)
+    first_day = max(schedule.valid_from, today)
+    if schedule.generated_until:
+        first_day = max(first_day, schedule.generated_until + timedelta(days=1))
+    last_day = min(schedule.valid_until, until)
+    if first_day > last_day:
+        return 0
+
+    window_start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+    window_end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+    with transaction.atomic():
+        existing = (
+            TimeSlot.objects
+            .filter(doctor_id=schedule.doctor_id, start__lt=window_end, end__gt=window_start)
+            .values_list('start', 'end')
+        )
+        now = timezone.now()
+        candidates = [
+            (start, end) for start, end in iter_schedule_slots(schedule, first_day, last_day) if start > now
+        ]
+        accepted, _ = split_overlapping(existing, candidates)
+        TimeSlot.objects.bulk_create(
+            [TimeSlot(doctor_id=schedule.doctor_id, start=start, end=end) for start, end in accepted],
+            batch_size=batch_size,
+        )
+        created = len(accepted)
+        if created:
+            # bulk_create sends no post_save signals.
+            invalidate_doctor(schedule.doctor_id)
+            publish_slots(schedule.doctor_id)
+            rebuild_summaries([schedule.doctor_id], since=window_start, until=window_end)
+        RecurringSchedule.objects.filter(pk=schedule.pk).update(generated_until=last_day)
+        schedule.generated_until = last_day
+    return created
+
+
+def publish_schedule(schedule):
+    """Generate a new schedule's first PUBLISH_HORIZON_DAYS; returns slots created."""
+    return materialize_schedule(schedule, until=timezone.localdate() + timedelta(days=PUBLISH_HORIZON_DAYS))
+
+
+def materialize_all(horizon_days=DEFAULT_HORIZON_DAYS, batch_size=BATCH_SIZE):
+    """Extend every active schedule to today + `horizon_days`; returns slots created."""
+    until = timezone.localdate() + timedelta(days=horizon_days)
+    total = 0
+    active = RecurringSchedule.objects.filter(valid_until__gte=timezone.localdate())
+    for schedule in active.iterator():
+        created = materialize_schedule(schedule, until=until, batch_size=batch_size)
+        if created:
+            logger.info(f'Generated {created} slots for schedule {schedule.pk}')
+        total += created
+    return total
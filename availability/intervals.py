@@ -0,0 +1,45 @@
+from bisect import bisect_left
+from itertools import accumulate
+
+
+class IntervalIndex:
+    """Static index over half-open [start, end) intervals answering overlap queries in O(log n).
+
+    Intervals are sorted by start and paired with a running maximum of
+    their ends: among the intervals starting before `end`, one overlaps
+    [start, end) exactly when the largest end exceeds `start`. This holds
+    even if the indexed intervals overlap each other.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self._starts = [start for start, _ in intervals]
+        self._max_end = list(accumulate((end for _, end in intervals), max))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def overlaps(self, start, end):
+        i = bisect_left(self._starts, end)
+        return i > 0 and self._max_end[i - 1] > start
+
+
+def split_overlapping(existing, candidates):
+    """Split `candidates` into (accepted, rejected) lists of (start, end) pairs.
+
+    A candidate is rejected if it overlaps an `existing` interval or an
+    earlier accepted candidate. Runs in O((n + m) log m) for n candidates
+    and m existing intervals instead of comparing every pair.
+    """
+    index = IntervalIndex(existing)
+    accepted, rejected = [], []
+    last_end = None
+    for start, end in sorted(candidates):
+        # Candidates arrive in start order, so only the latest accepted
+        # end can reach into this one.
+        if index.overlaps(start, end) or (last_end is not None and last_end > start):
+            rejected.append((start, end))
+            continue
+        accepted.append((start, end))
+        last_end = end if last_end is None else max(last_end, end)
+    return accepted, rejected
@@ -0,0 +1,88 @@
+import random
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from availability.models import TimeSlot
+from availability.directory import earliest_free_slots, ranked_free_slots
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN (ANALYZE on PostgreSQL) for the hot TimeSlot query shapes against a seeded dataset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200, help='Doctors to seed')
+        parser.add_argument('--slots-per-doctor', type=int, default=500, help='Slots to seed per doctor')
+        parser.add_argument('--no-seed', action='store_true', help='Explain against existing data only')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows instead of rolling back')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options['no_seed']:
+                self.seed(options['doctors'], options['slots_per_doctor'])
+            self.explain_all()
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def seed(self, doctors, slots_per_doctor):
+        from users.models import User
+        now = timezone.now()
+        rng = random.Random(42)
+        users = User.objects.bulk_create([
+            User(username=f'explain-doctor-{i}', role=User.DOCTOR) for i in range(doctors)
+        ])
+        if not all(u.pk for u in users):
+            users = list(User.objects.filter(username__startswith='explain-doctor-'))
+        slots = []
+        for doctor in users:
+            # Half the history is in the past, and most past slots are booked.
+            first = now - timedelta(minutes=15 * (slots_per_doctor // 2))
+            for n in range(slots_per_doctor):
+                start = first + timedelta(minutes=15 * n)
+                slots.append(TimeSlot(
+                    doctor=doctor,
+                    start=start,
+                    end=start + timedelta(minutes=15),
+                    is_booked=rng.random() < (0.8 if start < now else 0.3),
+                ))
+        TimeSlot.objects.bulk_create(slots, batch_size=5000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {TimeSlot._meta.db_table}')
+        self.stdout.write(f'Seeded {len(users)} doctors / {len(slots)} slots')
+
+    def explain_all(self):
+        doctor_ids = list(
+            TimeSlot.objects.order_by().values_list('doctor_id', flat=True).distinct()[:20]
+        )
+        if not doctor_ids:
+            self.stderr.write('No slots to explain against; drop --no-seed')
+            return
+        doctor_id = doctor_ids[0]
+        queries = {
+            'available_for_doctor': TimeSlot.available_for_doctor(doctor_id)[:10],
+            'my_slots': TimeSlot.objects.filter(doctor_id=doctor_id).order_by('start'),
+            'doctor_dashboard': TimeSlot.objects.filter(doctor_id=doctor_id).order_by('start')[:10],
+            'doctor_directory': ranked_free_slots(doctor_ids),
+            'earliest_free_slots': earliest_free_slots(),
+        }
+        for name, qs in queries.items():
+            self.report(name, self.explain(qs))
+
+    def explain(self, qs):
+        # QuerySet.explain() mis-wraps queries filtered on a window function,
+        # so prefix the compiled statement ourselves.
+        options = {'analyze': True, 'buffers': True} if connection.vendor == 'postgresql' else {}
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix(**options)} {sql}', params)
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def report(self, name, plan):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {name}'))
+        self.stdout.write(plan)
+        seq_scan = f'Seq Scan on {TimeSlot._meta.db_table}' in plan or f'SCAN {TimeSlot._meta.db_table}' in plan
+        if seq_scan:
+            self.stdout.write(self.style.WARNING(f'{name}: sequential scan on {TimeSlot._meta.db_table}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{name}: index scan'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from availability.generation import materialize_all, DEFAULT_HORIZON_DAYS, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Materialize TimeSlots from recurring schedules up to a rolling horizon (safe to run nightly).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEFAULT_HORIZON_DAYS, help='Horizon in days from today')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per bulk_create')
+
+    def handle(self, *args, **options):
+        created = materialize_all(horizon_days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Created {created} slots'))
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from availability.summary import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute DoctorDailySummary rows from TimeSlot. Without --days this rebuilds everything; '
+        'with --days it only refreshes the recent/upcoming window, as a periodic delta job.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only days from N days ago onwards')
+        parser.add_argument('--doctor', type=int, action='append', help='Doctor id (repeatable)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            first = timezone.localdate() - timedelta(days=options['days'])
+            since = timezone.make_aware(datetime.combine(first, datetime.min.time()))
+        written = rebuild(doctor_ids=options['doctor'], since=since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily summaries'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='blocked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['doctor', 'start'], name='timeslot_doctor_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(condition=models.Q(('blocked', False), ('is_booked', False)), fields=['doctor', 'start'], name='timeslot_free_doctor_start_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    # SQLite has no range types; overlaps there are caught by
+    # TimeSlotForm and availability.intervals instead.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE availability_timeslot ADD CONSTRAINT timeslot_no_overlap '
+        'EXCLUDE USING gist (doctor_id WITH =, tstzrange("start", "end", \'[)\') WITH &&)'
+    )
+
+
+def remove_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE availability_timeslot DROP CONSTRAINT IF EXISTS timeslot_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0004_recurringschedule'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(add_exclusion_constraint, remove_exclusion_constraint),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0005_timeslot_no_overlap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(condition=models.Q(('blocked', False), ('is_booked', False)), fields=['start', 'id'], name='timeslot_free_start_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0006_timeslot_free_start_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('slots_published', models.PositiveIntegerField(default=0)),
+                ('slots_booked', models.PositiveIntegerField(default=0)),
+                ('utilization', models.FloatField(default=0.0, help_text='slots_booked / slots_published')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Doctor Daily Summary',
+                'verbose_name_plural': 'Doctor Daily Summaries',
+                'ordering': ['doctor', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day'), name='dailysummary_doctor_day_uniq')],
+            },
+        ),
+    ]
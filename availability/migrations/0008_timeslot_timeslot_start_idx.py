@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0007_doctordailysummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['start'], name='timeslot_start_idx'),
+        ),
+    ]
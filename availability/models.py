@@ -2,21 +2,46 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+# PostgreSQL exclusion constraint (see migration 0005) rejecting overlapping
+# [start, end) ranges for the same doctor.
+OVERLAP_CONSTRAINT = 'timeslot_no_overlap'
+OVERLAP_MESSAGE = 'This slot overlaps one of your existing slots'
+
 
 class TimeSlot(models.Model):
     doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeslots')
     start = models.DateTimeField()
     end = models.DateTimeField()
     is_booked = models.BooleanField(default=False)
+    # Overlaps a busy event in the doctor's Google Calendar (calendar_integration.busy).
+    blocked = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['start']
         verbose_name = 'Time Slot'
         verbose_name_plural = 'Time Slots'
+        indexes = [
+            # available_for_doctor, my_slots and the dashboards all filter by
+            # doctor and order by start.
+            models.Index(fields=['doctor', 'start'], name='timeslot_doctor_start_idx'),
+            models.Index(
+                fields=['doctor', 'start'],
+                condition=models.Q(is_booked=False, blocked=False),
+                name='timeslot_free_doctor_start_idx',
+            ),
+            # Cross-doctor listings of free slots, paginated by (start, id).
+            models.Index(
+                fields=['start', 'id'],
+                condition=models.Q(is_booked=False, blocked=False),
+                name='timeslot_free_start_id_idx',
+            ),
+            # Admin date_hierarchy drill-down across all doctors.
+            models.Index(fields=['start'], name='timeslot_start_idx'),
+        ]
 
     def __str__(self):
-        status = 'booked' if self.is_booked else 'free'
+        status = 'booked' if self.is_booked else 'busy' if self.blocked else 'free'
         return f"{self.doctor.username}: {self.start.isoformat()} - {self.end.isoformat()} ({status})"
 
     @property
@@ -25,4 +50,76 @@ class TimeSlot(models.Model):
 
     @classmethod
     def available_for_doctor(cls, doctor):
-        return cls.objects.filter(doctor=doctor, is_booked=False, start__gt=timezone.now()).order_by('start')
+        return cls.objects.filter(doctor=doctor, is_booked=False, blocked=False, start__gt=timezone.now()).order_by('start')
+
+    @classmethod
+    def overlapping(cls, doctor, start, end):
+        """Slots of `doctor` intersecting the half-open range [start, end)."""
+        return cls.objects.filter(doctor=doctor, start__lt=end, end__gt=start)
+
+    @staticmethod
+    def is_overlap_violation(exc):
+        """True if an IntegrityError was raised by the overlap exclusion constraint."""
+        return OVERLAP_CONSTRAINT in str(exc)
+
+
+class RecurringSchedule(models.Model):
+    """Weekly availability pattern, e.g. Mon-Fri 09:00-12:00 in 15-minute slots.
+
+    Slots are materialized ahead of time by `availability.generation`;
+    `generated_until` records how far that has got so nightly runs only
+    add the newly uncovered days.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='schedules')
+    weekdays = models.JSONField(default=list, help_text='Weekday numbers, 0 = Monday')
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=15)
+    valid_from = models.DateField()
+    valid_until = models.DateField()
+    generated_until = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['valid_from']
+        verbose_name = 'Recurring Schedule'
+        verbose_name_plural = 'Recurring Schedules'
+
+    def __str__(self):
+        days = ','.join(dict(self.WEEKDAY_CHOICES)[d][:3] for d in sorted(self.weekdays))
+        return f"{self.doctor.username}: {days} {self.start_time:%H:%M}-{self.end_time:%H:%M} until {self.valid_until}"
+
+
+class DoctorDailySummary(models.Model):
+    """Per-doctor, per-day slot counts kept up to date by `availability.summary`.
+
+    Dashboards read utilization trends from here (one row per day) instead
+    of aggregating TimeSlot and Booking on every request.
+    """
+    doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_summaries')
+    day = models.DateField()
+    slots_published = models.PositiveIntegerField(default=0)
+    slots_booked = models.PositiveIntegerField(default=0)
+    utilization = models.FloatField(default=0.0, help_text='slots_booked / slots_published')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['doctor', 'day']
+        verbose_name = 'Doctor Daily Summary'
+        verbose_name_plural = 'Doctor Daily Summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day'], name='dailysummary_doctor_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.username} {self.day}: {self.slots_booked}/{self.slots_published}"
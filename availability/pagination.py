@@ -0,0 +1,79 @@
+"""Keyset (cursor) pagination over (start, id) for slot listings.
+
+Each page continues strictly after the last row of the previous one, so
+deep pages cost the same as the first: no OFFSET scan, and memory per
+page is bounded by the page size.
+"""
+import base64
+from datetime import datetime, time
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(start, pk):
+    raw = f'{start.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (start, pk) from a cursor; raise ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        start, pk = raw.split('|')
+        return datetime.fromisoformat(start), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        raise ValueError('Invalid limit')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def parse_moment(value):
+    """Parse an ISO datetime or date (midnight) query parameter; None if empty."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_LIMIT, descending=False):
+    """Return (rows, next_cursor) for a queryset of slots (instances or .values() dicts).
+
+    The queryset is ordered by (start, id) here, newest first when
+    `descending`; `next_cursor` is None on the last page.
+    """
+    if descending:
+        queryset = queryset.order_by('-start', '-id')
+    else:
+        queryset = queryset.order_by('start', 'id')
+    if cursor:
+        start, pk = decode_cursor(cursor)
+        if descending:
+            queryset = queryset.filter(Q(start__lt=start) | Q(start=start, id__lt=pk))
+        else:
+            queryset = queryset.filter(Q(start__gt=start) | Q(start=start, id__gt=pk))
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(_field(rows[-1], 'start'), _field(rows[-1], 'id'))
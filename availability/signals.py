@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import TimeSlot
+from .cache import invalidate_doctor
+from .summary import schedule_refresh, slot_day
+
+# Sent after commit when a doctor's free slots change other than by a
+# booking (created, freed, blocked or unblocked); slot_ids are the slots
+# that became free, None for a whole generated schedule or when none did.
+slots_published = Signal()
+
+
+def publish_slots(doctor_id, slot_ids=None):
+    transaction.on_commit(lambda: slots_published.send(sender=TimeSlot, doctor_id=doctor_id, slot_ids=slot_ids))
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def timeslot_changed(sender, instance, **kwargs):
+    invalidate_doctor(instance.doctor_id)
+    schedule_refresh(instance.doctor_id, [slot_day(instance.start)])
+
+
+@receiver(post_save, sender=TimeSlot)
+def timeslot_saved(sender, instance, **kwargs):
+    if not instance.is_booked and not instance.blocked:
+        publish_slots(instance.doctor_id, [instance.pk])
+
+
+@receiver(post_save, sender='bookings.Booking')
+@receiver(post_delete, sender='bookings.Booking')
+def booking_changed(sender, instance, **kwargs):
+    invalidate_doctor(instance.slot.doctor_id)
+    schedule_refresh(instance.slot.doctor_id, [slot_day(instance.slot.start)])
@@ -0,0 +1,127 @@
+"""Maintenance of DoctorDailySummary rows.
+
+A day's row is recomputed from that day's slots only (an indexed range
+on (doctor, start)), so updates stay cheap and idempotent: running them
+twice, or after a missed signal, converges on the right counts.
+"""
+import logging
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DoctorDailySummary, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+# Dashboard trend window: the past week and the next two weeks.
+TREND_DAYS_BACK = 7
+TREND_DAYS_AHEAD = 14
+
+
+def slot_day(start):
+    """Calendar day (in the current time zone) a slot start counts towards."""
+    return timezone.localdate(start)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _row(doctor_id, day, published, booked):
+    return DoctorDailySummary(
+        doctor_id=doctor_id,
+        day=day,
+        slots_published=published,
+        slots_booked=booked,
+        utilization=booked / published if published else 0.0,
+    )
+
+
+def _upsert(rows):
+    DoctorDailySummary.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['doctor', 'day'],
+        update_fields=['slots_published', 'slots_booked', 'utilization', 'updated_at'],
+    )
+
+
+def refresh_days(doctor_id, days):
+    """Recompute the summary rows for `doctor_id` on each of `days`.
+
+    Days left without slots lose their row, which also covers doctors
+    deleted since the refresh was scheduled.
+    """
+    rows, empty = [], []
+    for day in set(days):
+        start, end = _day_bounds(day)
+        counts = TimeSlot.objects.filter(doctor_id=doctor_id, start__gte=start, start__lt=end).aggregate(
+            published=Count('id'),
+            booked=Count('id', filter=Q(is_booked=True)),
+        )
+        if counts['published']:
+            rows.append(_row(doctor_id, day, counts['published'], counts['booked']))
+        else:
+            empty.append(day)
+    if empty:
+        DoctorDailySummary.objects.filter(doctor_id=doctor_id, day__in=empty).delete()
+    if rows:
+        _upsert(rows)
+
+
+def schedule_refresh(doctor_id, days):
+    """Refresh once the surrounding transaction commits (immediately outside one)."""
+    days = set(days)
+    transaction.on_commit(lambda: refresh_days(doctor_id, days))
+
+
+def rebuild(doctor_ids=None, since=None, until=None):
+    """Recompute every summary row for slots starting in [since, until).
+
+    Returns the number of rows written. Days inside the range that no
+    longer have any slots are deleted.
+    """
+    slots = TimeSlot.objects.all()
+    summaries = DoctorDailySummary.objects.all()
+    if doctor_ids is not None:
+        slots = slots.filter(doctor_id__in=doctor_ids)
+        summaries = summaries.filter(doctor_id__in=doctor_ids)
+    if since:
+        slots = slots.filter(start__gte=since)
+        summaries = summaries.filter(day__gte=slot_day(since))
+    if until:
+        slots = slots.filter(start__lt=until)
+        summaries = summaries.filter(day__lt=slot_day(until))
+    counts = (
+        slots.annotate(day=TruncDate('start'))
+        .values('doctor_id', 'day')
+        .annotate(published=Count('id'), booked=Count('id', filter=Q(is_booked=True)))
+        .order_by()
+    )
+    rows = [_row(c['doctor_id'], c['day'], c['published'], c['booked']) for c in counts]
+    with transaction.atomic():
+        keep = {(r.doctor_id, r.day) for r in rows}
+        stale = [pk for pk, doctor_id, day in summaries.values_list('pk', 'doctor_id', 'day') if (doctor_id, day) not in keep]
+        summaries.filter(pk__in=stale).delete()
+        if rows:
+            _upsert(rows)
+    logger.info(f'Rebuilt {len(rows)} daily summaries, removed {len(stale)}')
+    return len(rows)
+
+
+def utilization_trend(doctor, days_back=TREND_DAYS_BACK, days_ahead=TREND_DAYS_AHEAD, today=None):
+    """Summary rows from `days_back` days ago to `days_ahead` days ahead, oldest first.
+
+    One indexed range read on (doctor, day); days without slots are
+    filled with empty rows so the trend has no gaps.
+    """
+    today = today or timezone.localdate()
+    first = today - timedelta(days=days_back)
+    last = today + timedelta(days=days_ahead)
+    rows = {s.day: s for s in DoctorDailySummary.objects.filter(doctor=doctor, day__gte=first, day__lte=last)}
+    return [
+        rows.get(day) or _row(doctor.pk, day, 0, 0)
+        for day in (first + timedelta(days=n) for n in range((last - first).days + 1))
+    ]
@@ -0,0 +1,198 @@
+import re
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from bookings.models import Booking
+from users.models import User
+from .cache import cached_free_slots, stats
+from .generation import DEFAULT_HORIZON_DAYS, PUBLISH_HORIZON_DAYS, materialize_all
+from .models import RecurringSchedule, TimeSlot
+from .pagination import MAX_LIMIT, decode_cursor, encode_cursor, keyset_page, parse_limit
+
+
+class AvailabilityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        self.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        self.patient = User.objects.create(username='pat', role=User.PATIENT)
+        start = timezone.now() + timedelta(days=1)
+        self.slots = [
+            TimeSlot.objects.create(doctor=self.doctor, start=start + timedelta(hours=n), end=start + timedelta(hours=n, minutes=30))
+            for n in range(3)
+        ]
+
+    def free_ids(self):
+        return [s.id for s in cached_free_slots([self.doctor.pk], 5)[self.doctor.pk]]
+
+    def test_booking_invalidates_on_commit(self):
+        self.assertEqual(self.free_ids(), [s.pk for s in self.slots])
+        with self.assertNumQueries(0):
+            self.free_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_for_slot(self.slots[0].pk, self.patient)
+        self.assertEqual(self.free_ids(), [s.pk for s in self.slots[1:]])
+        self.assertEqual(stats.snapshot()['computed'], 2)
+
+    def test_uncommitted_booking_keeps_cached_list(self):
+        self.free_ids()
+        with self.captureOnCommitCallbacks(execute=False):
+            Booking.create_for_slot(self.slots[0].pk, self.patient)
+        self.assertEqual(self.free_ids(), [s.pk for s in self.slots])
+
+
+@override_settings(PROFILING_STRICT=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now() + timedelta(days=1)
+        cls.patient = User.objects.create(username='pat', role=User.PATIENT)
+        cls.doctors = [User.objects.create(username=f'doc{n}', role=User.DOCTOR) for n in range(6)]
+        for doctor in cls.doctors:
+            slots = TimeSlot.objects.bulk_create([
+                TimeSlot(doctor=doctor, start=start + timedelta(hours=n), end=start + timedelta(hours=n, minutes=30))
+                for n in range(-30, 8)
+            ])
+            Booking.create_for_slot(slots[-1].pk, cls.patient)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_index_anonymous(self):
+        self.assertEqual(self.client.get(reverse('availability_index')).status_code, 200)
+
+    def test_index_patient(self):
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('availability_index')).status_code, 200)
+
+    def test_my_slots(self):
+        self.client.force_login(self.doctors[0])
+        for window in ('upcoming', 'past', 'all'):
+            response = self.client.get(reverse('my_slots'), {'window': window, 'limit': 5})
+            self.assertEqual(response.status_code, 200)
+
+
+class CreateScheduleTests(TestCase):
+    def test_request_generates_first_weeks_and_command_the_rest(self):
+        doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        self.client.force_login(doctor)
+        today = timezone.localdate()
+        response = self.client.post(reverse('create_schedule'), {
+            'weekdays': list(range(7)), 'start_time': '09:00', 'end_time': '10:00', 'slot_minutes': 30,
+            'valid_from': today + timedelta(days=1), 'valid_until': today + timedelta(days=365),
+        })
+        self.assertRedirects(response, reverse('my_slots'), fetch_redirect_response=False)
+        schedule = RecurringSchedule.objects.get(doctor=doctor)
+        self.assertEqual(schedule.generated_until, today + timedelta(days=PUBLISH_HORIZON_DAYS))
+        self.assertEqual(TimeSlot.objects.filter(doctor=doctor).count(), PUBLISH_HORIZON_DAYS * 2)
+
+        materialize_all()
+        self.assertEqual(TimeSlot.objects.filter(doctor=doctor).count(), DEFAULT_HORIZON_DAYS * 2)
+
+
+class ConditionalIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        self.patient = User.objects.create(username='pat', role=User.PATIENT)
+        start = timezone.now() + timedelta(days=1)
+        self.slot = TimeSlot.objects.create(doctor=self.doctor, start=start, end=start + timedelta(minutes=30))
+
+    def test_anonymous_visitors_share_an_etag_without_a_csrf_cookie(self):
+        response = self.client.get(reverse('availability_index'))
+        self.assertNotIn('csrftoken', response.cookies)
+        self.assertIn('Cookie', response['Vary'])
+        other = self.client_class().get(reverse('availability_index'))
+        self.assertEqual(other['ETag'], response['ETag'])
+
+        again = self.client.get(reverse('availability_index'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertIn('Cookie', again['Vary'])
+
+    def test_booking_changes_the_etag(self):
+        etag = self.client.get(reverse('availability_index'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_for_slot(self.slot.pk, self.patient)
+        response = self.client.get(reverse('availability_index'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_audiences_get_different_etags(self):
+        anonymous = self.client.get(reverse('availability_index'))['ETag']
+        self.client.force_login(self.patient)
+        patient = self.client.get(reverse('availability_index'))['ETag']
+        self.client.force_login(self.doctor)
+        doctor = self.client.get(reverse('availability_index'))['ETag']
+        self.assertEqual(len({anonymous, patient, doctor}), 3)
+
+    def test_patient_revalidates_and_cached_csrf_token_stays_valid(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.patient)
+        first = client.get(reverse('availability_index'))
+        again = client.get(reverse('availability_index'), headers={'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', first.content.decode()).group(1)
+        response = client.post(reverse('create_booking', args=[self.slot.pk]), {'csrfmiddlewaretoken': token})
+        self.assertNotEqual(response.status_code, 403)
+        self.assertTrue(Booking.objects.filter(slot=self.slot, patient=self.patient).exists())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Three doctors with slots at the same starts, so pages split ties on start.
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        doctors = [User.objects.create(username=f'doc{n}', role=User.DOCTOR) for n in range(3)]
+        TimeSlot.objects.bulk_create([
+            TimeSlot(doctor=doctor, start=cls.start + timedelta(hours=h), end=cls.start + timedelta(hours=h, minutes=30))
+            for h in range(4) for doctor in doctors
+        ])
+        cls.ordered = list(TimeSlot.objects.order_by('start', 'id').values_list('id', flat=True))
+
+    def walk(self, limit, descending=False):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(TimeSlot.objects.all(), cursor, limit, descending=descending)
+            pages.append([row.id for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_every_row_once_across_ties(self):
+        for limit in (1, 2, 5, 7):
+            pages = self.walk(limit)
+            self.assertEqual([pk for page in pages for pk in page], self.ordered, limit)
+            self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+
+    def test_exact_multiple_of_limit_ends_without_empty_page(self):
+        pages = self.walk(len(self.ordered) // 2)
+        self.assertEqual([len(page) for page in pages], [6, 6])
+        rows, cursor = keyset_page(TimeSlot.objects.all(), limit=len(self.ordered))
+        self.assertEqual((len(rows), cursor), (12, None))
+
+    def test_descending(self):
+        pages = self.walk(5, descending=True)
+        self.assertEqual([pk for page in pages for pk in page], self.ordered[::-1])
+
+    def test_cursor_round_trip_and_invalid_cursor(self):
+        self.assertEqual(decode_cursor(encode_cursor(self.start, 42)), (self.start, 42))
+        for cursor in ('not-a-cursor', encode_cursor(self.start, 1)[:-3] + '!!!', ''.join(['x'] * 5)):
+            with self.assertRaises(ValueError):
+                keyset_page(TimeSlot.objects.all(), cursor, 5)
+
+    def test_limit_bounds(self):
+        self.assertEqual(parse_limit('0'), 1)
+        self.assertEqual(parse_limit(str(MAX_LIMIT + 1)), MAX_LIMIT)
+        self.assertEqual(parse_limit(None, default=7), 7)
+        with self.assertRaises(ValueError):
+            parse_limit('ten')
+
+    def test_api_pages_and_rejects_bad_cursor(self):
+        seen, cursor = [], ''
+        while cursor is not None:
+            body = self.client.get(reverse('api_free_slots'), {'limit': 5, 'cursor': cursor}).json()
+            seen += [row['id'] for row in body['results']]
+            cursor = body['next']
+        self.assertEqual(seen, self.ordered)
+        self.assertEqual(self.client.get(reverse('api_free_slots'), {'cursor': 'bogus'}).status_code, 400)
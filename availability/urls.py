@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
-    path('', views.index, name='availability_index'),
+    path('', views.index_async if settings.HMS_ASYNC_VIEWS else views.index, name='availability_index'),
     path('my-slots/', views.my_slots, name='my_slots'),
     path('create-slot/', views.create_slot, name='create_slot'),
+    path('create-schedule/', views.create_schedule, name='create_schedule'),
+    path('api/doctors/', api.doctors, name='api_doctors'),
+    path('api/slots/', api.free_slots, name='api_free_slots'),
+    path('api/slots/earliest/', api.earliest_slots, name='api_earliest_slots'),
 ]
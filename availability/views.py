@@ -1,30 +1,181 @@
+import csv
+import hashlib
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from .models import TimeSlot
-from .forms import TimeSlotForm
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+from .models import TimeSlot, OVERLAP_MESSAGE
+from .forms import TimeSlotForm, RecurringScheduleForm
+from .generation import publish_schedule, PUBLISH_HORIZON_DAYS
+from .directory import adoctor_directory, doctor_directory, DIRECTORY_QUERY_BUDGET
+from .cache import get_versions, version_timestamp
+from .pagination import keyset_page, parse_limit, parse_moment
 from django.contrib import messages
+from django.db import IntegrityError, transaction
+from hms.db_router import use_replica
+from hms.profiling import query_budget
 
+MY_SLOTS_WINDOWS = ('upcoming', 'past', 'all')
+MY_SLOTS_PAGE_SIZE = 50
 
+
+def _page_etag(request, *parts):
+    """ETag for a page from its data (`parts`) and the audience it is rendered for.
+
+    Anonymous visitors all share one ETag. Signed-in pages show the user's
+    name, so their id is included. A patient's page also carries a masked
+    CSRF token, which stays valid for as long as their CSRF cookie does;
+    `Vary: Cookie` keeps a copy from before a new cookie from being reused.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        audience = ('anonymous',)
+    else:
+        audience = (user.role, user.pk)
+    return quote_etag(hashlib.md5(repr((audience, parts)).encode()).hexdigest())
+
+
+def _conditional_render(request, template, context, etag, last_modified):
+    """Answer 304 if the client's copy is current, otherwise render with validators."""
+    # Pending flash messages are rendered into the page, so never 304 over them.
+    if not len(messages.get_messages(request)):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            patch_vary_headers(response, ['Cookie'])
+            return response
+    response = render(request, template, context)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ['Cookie'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# The directory's own queries plus loading the session and user.
+@use_replica()
+@query_budget(DIRECTORY_QUERY_BUDGET + 2)
 def index(request):
-    """List all doctors and their upcoming available slots."""
-    doctors = []
-    from users.models import User
-    doctors_qs = User.objects.filter(role=User.DOCTOR)
-    for d in doctors_qs:
-        slots = TimeSlot.available_for_doctor(d)[:10]
-        doctors.append({'doctor': d, 'slots': slots})
-    return render(request, 'availability/index.html', {'doctors': doctors})
+    """List doctors (paginated) and their upcoming available slots.
+
+    Validators come from the per-doctor availability versions plus the
+    first listed slot (which changes when it starts), so an unchanged page
+    is answered with 304 before any template rendering.
+    """
+    return _index_response(request, doctor_directory(request.GET.get('page')))
+
+
+async def index_async(request):
+    """index() for ASGI deployments.
+
+    The doctor page is read with the async ORM; cache lookups and
+    rendering run in a worker thread.
+    """
+    with use_replica():
+        page = await adoctor_directory(request.GET.get('page'))
+        return await sync_to_async(_index_response)(request, page)
+
+
+def _index_response(request, page):
+    etag = _page_etag(request, page.number, [
+        (e['doctor'].id, e['version'], e['slots'][0].id if e['slots'] else None) for e in page
+    ])
+    last_modified = max((version_timestamp(e['version']) for e in page), default=None)
+    if request.user.is_authenticated and request.user.is_patient():
+        audience = 'patient'
+    else:
+        audience = 'user' if request.user.is_authenticated else 'anonymous'
+    context = {'doctors': page, 'page_obj': page, 'audience': audience}
+    return _conditional_render(request, 'availability/index.html', context, etag, last_modified)
 
 
 @login_required
+@query_budget(2)
 def my_slots(request):
-    """Doctor dashboard to view their own time slots."""
+    """Doctor dashboard to view their own time slots.
+
+    Shows one keyset page of a date window (upcoming by default, past
+    newest first, or all) with only the columns the template needs;
+    `?format=csv` streams the whole window instead.
+    """
     user = request.user
     if not user.is_doctor():
         messages.error(request, 'Only doctors can access this page')
         return redirect('availability_index')
-    slots = TimeSlot.objects.filter(doctor=user).order_by('start')
-    return render(request, 'availability/my_slots.html', {'slots': slots})
+    window = request.GET.get('window', 'upcoming')
+    if window not in MY_SLOTS_WINDOWS:
+        window = 'upcoming'
+    try:
+        start_from = parse_moment(request.GET.get('from'))
+        start_to = parse_moment(request.GET.get('to'))
+        limit = parse_limit(request.GET.get('limit'), default=MY_SLOTS_PAGE_SIZE)
+        cursor = request.GET.get('cursor')
+        slots = _window_slots(user, window, start_from, start_to)
+        if request.GET.get('format') == 'csv':
+            return _slots_csv(user, slots, window)
+        rows, next_cursor = keyset_page(
+            slots.values('id', 'start', 'end', 'is_booked', 'blocked'), cursor, limit, descending=window == 'past',
+        )
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('my_slots')
+
+    version = get_versions([user.pk])[user.pk]
+    # The first row is included because upcoming slots leave the window
+    # as they start, without a version change.
+    etag = _page_etag(
+        request, version, window, request.GET.get('from'), request.GET.get('to'), cursor, limit,
+        rows[0]['id'] if rows else None,
+    )
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    context = {
+        'slots': rows,
+        'window': window,
+        'windows': MY_SLOTS_WINDOWS,
+        'next_cursor': next_cursor,
+        'query': params.urlencode(),
+    }
+    return _conditional_render(request, 'availability/my_slots.html', context, etag, version_timestamp(version))
+
+
+def _window_slots(doctor, window, start_from=None, start_to=None):
+    slots = TimeSlot.objects.filter(doctor=doctor)
+    now = timezone.now()
+    if window == 'upcoming':
+        slots = slots.filter(start__gte=now)
+    elif window == 'past':
+        slots = slots.filter(start__lt=now)
+    if start_from:
+        slots = slots.filter(start__gte=start_from)
+    if start_to:
+        slots = slots.filter(start__lt=start_to)
+    return slots
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _slots_csv(doctor, slots, window):
+    """Stream the window as CSV, fetching rows in chunks instead of loading them all."""
+    writer = csv.writer(_Echo())
+    rows = slots.order_by('start', 'id').values_list('start', 'end', 'is_booked', 'blocked').iterator(chunk_size=2000)
+
+    def lines():
+        yield writer.writerow(['start', 'end', 'booked', 'busy'])
+        for start, end, is_booked, blocked in rows:
+            yield writer.writerow([start.isoformat(), end.isoformat(), 'yes' if is_booked else 'no', 'yes' if blocked else 'no'])
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="slots-{doctor.username}-{window}.csv"'
+    return response
 
 
 @login_required
@@ -36,13 +187,46 @@ def create_slot(request):
         return redirect('availability_index')
 
     if request.method == 'POST':
-        form = TimeSlotForm(request.POST)
+        form = TimeSlotForm(request.POST, doctor=user)
         if form.is_valid():
             slot = form.save(commit=False)
             slot.doctor = user
-            slot.save()
-            messages.success(request, 'Time slot created')
-            return redirect('my_slots')
+            try:
+                with transaction.atomic():
+                    slot.save()
+            except IntegrityError as exc:
+                if not TimeSlot.is_overlap_violation(exc):
+                    raise
+                form.add_error(None, OVERLAP_MESSAGE)
+            else:
+                messages.success(request, 'Time slot created')
+                return redirect('my_slots')
     else:
-        form = TimeSlotForm()
+        form = TimeSlotForm(doctor=user)
     return render(request, 'availability/create_slot.html', {'form': form})
+
+
+@login_required
+def create_schedule(request):
+    """Doctor publishes a recurring schedule; its first weeks of slots are generated in bulk."""
+    user = request.user
+    if not user.is_doctor():
+        messages.error(request, 'Only doctors can create schedules')
+        return redirect('availability_index')
+
+    if request.method == 'POST':
+        form = RecurringScheduleForm(request.POST)
+        if form.is_valid():
+            schedule = form.save(commit=False)
+            schedule.doctor = user
+            schedule.save()
+            created = publish_schedule(schedule)
+            messages.success(
+                request,
+                f'Schedule created with {created} slots for the next {PUBLISH_HORIZON_DAYS} days; '
+                'later slots are added by the nightly generation',
+            )
+            return redirect('my_slots')
+    else:
+        form = RecurringScheduleForm()
+    return render(request, 'availability/create_schedule.html', {'form': form})
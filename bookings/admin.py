@@ -1,8 +1,33 @@
 from django.contrib import admin
-from .models import Booking
+from django.utils import timezone
+from hms.paginator import EstimatedCountPaginator
+from .models import Booking, NotificationOutbox
 
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('slot', 'patient', 'created_at')
+    # Booking and TimeSlot __str__ follow patient and slot.doctor.
+    list_select_related = ('slot__doctor', 'patient')
+    # Both searches match users_user.username through its trigram index
+    # (users migration 0002_username_trigram_idx).
     search_fields = ('patient__username', 'slot__doctor__username')
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('slot', 'patient')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('action', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'action')
+    search_fields = ('to_email',)
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected notifications')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=NotificationOutbox.SENT).update(
+            status=NotificationOutbox.PENDING, attempts=0, next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f'{updated} notifications requeued')
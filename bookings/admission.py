@@ -0,0 +1,162 @@
+"""Per-doctor admission control and virtual queue for booking surges."""
+import os
+import secrets
+from dataclasses import dataclass
+from django.core.cache import cache
+from django.utils import timezone
+from availability.models import TimeSlot
+from hms import metrics
+
+# Ticket n is admitted while n <= done + CONCURRENCY, `done` being the last
+# ticket that, with every earlier one, has finished or expired.
+CONCURRENCY = int(os.getenv('BOOKING_CONCURRENCY_PER_DOCTOR', '4'))
+# A waiting ticket expires this long after its last poll; an admitted one
+# has LEASE_SECONDS to finish its booking attempt.
+HEARTBEAT_SECONDS = 15
+LEASE_SECONDS = 30
+POLL_SECONDS = 1
+STATE_TIMEOUT = 3600
+COUNT_TIMEOUT = 300
+SLOT_DOCTOR_TIMEOUT = 86400
+
+SOLD_OUT = 'sold_out'
+TAKEN = 'taken'
+EXPIRED = 'expired'
+
+ADMISSION_DECISIONS = metrics.counter(
+    'hms_booking_admission_total', 'Booking attempts by admission decision', ['outcome'],
+)
+
+
+@dataclass
+class Ticket:
+    doctor_id: int
+    number: int
+    key: str
+    admitted: bool = False
+    position: int = 0
+
+
+def _key(doctor_id, *parts):
+    return ':'.join(['admission', str(doctor_id), *map(str, parts)])
+
+
+def slot_doctor(slot_id):
+    """Doctor id of a slot (cached, a slot never changes doctor), or None if there is no such slot."""
+    key = f'admission:slot:{slot_id}'
+    doctor_id = cache.get(key)
+    if doctor_id is None:
+        doctor_id = TimeSlot.objects.filter(pk=slot_id).values_list('doctor_id', flat=True).first()
+        if doctor_id is not None:
+            cache.set(key, doctor_id, timeout=SLOT_DOCTOR_TIMEOUT)
+    return doctor_id
+
+
+def _count_free(doctor_id):
+    return TimeSlot.objects.filter(doctor_id=doctor_id, is_booked=False, blocked=False, start__gt=timezone.now()).count()
+
+
+def free_slot_count(doctor_id):
+    """Free future slots of the doctor, as counted after the last change to them."""
+    key = _key(doctor_id, 'free')
+    count = cache.get(key)
+    if count is None:
+        count = _count_free(doctor_id)
+        cache.add(key, count, timeout=COUNT_TIMEOUT)
+    return count
+
+
+def recount(doctor_id):
+    """Store the doctor's free slot count, read from the database.
+
+    Called after commit, so a later recount never subtracts a booking an
+    earlier one already saw.
+    """
+    cache.set(_key(doctor_id, 'free'), _count_free(doctor_id), timeout=COUNT_TIMEOUT)
+
+
+def slots_published(doctor_id, slot_ids=None):
+    """Recount the doctor's free slots after they changed, and forget `slot_ids` seen taken."""
+    recount(doctor_id)
+    if slot_ids:
+        forget_taken(doctor_id, slot_ids)
+
+
+def refusal(doctor_id, slot_id=None):
+    """SOLD_OUT or TAKEN if the attempt is known to fail, else None."""
+    if slot_id is not None and cache.get(_key(doctor_id, 'taken', slot_id)):
+        reason = TAKEN
+    elif free_slot_count(doctor_id) <= 0:
+        reason = SOLD_OUT
+    else:
+        return None
+    ADMISSION_DECISIONS.inc(outcome=reason)
+    return reason
+
+
+def note_taken(doctor_id, slot_id):
+    """Remember that the slot lost a booking race, until it is freed again."""
+    cache.set(_key(doctor_id, 'taken', slot_id), 1, timeout=COUNT_TIMEOUT)
+
+
+def forget_taken(doctor_id, slot_ids):
+    cache.delete_many([_key(doctor_id, 'taken', slot_id) for slot_id in slot_ids])
+
+
+def _advance(doctor_id):
+    """Move `done` past finished and expired tickets; return it."""
+    issued = cache.get(_key(doctor_id, 'issued'), 0)
+    done = cache.get(_key(doctor_id, 'done'), 0)
+    while done < issued:
+        n = done + 1
+        if not cache.get(_key(doctor_id, 'ended', n)):
+            # Tombstone a vanished holder so a late take() cannot revive it.
+            if not cache.add(_key(doctor_id, 'holder', n), EXPIRED, timeout=STATE_TIMEOUT):
+                holder = cache.get(_key(doctor_id, 'holder', n))
+                if holder is not None and holder != EXPIRED:
+                    break  # waiting at the front, or being served
+        if not cache.add(_key(doctor_id, 'advanced', n), 1, timeout=STATE_TIMEOUT):
+            break  # another caller is moving the queue
+        cache.set(_key(doctor_id, 'done'), n, timeout=None)
+        done = n
+    return done
+
+
+def _place(ticket, done):
+    ticket.admitted = ticket.number <= done + CONCURRENCY
+    ticket.position = max(0, ticket.number - done - CONCURRENCY)
+    if ticket.admitted:
+        cache.touch(_key(ticket.doctor_id, 'holder', ticket.number), LEASE_SECONDS)
+    return ticket
+
+
+def take(doctor_id):
+    """Join the doctor's queue; the returned ticket says whether it may book now."""
+    cache.add(_key(doctor_id, 'issued'), 0, timeout=None)
+    key = secrets.token_urlsafe(12)
+    while True:
+        number = cache.incr(_key(doctor_id, 'issued'))
+        if cache.add(_key(doctor_id, 'holder', number), key, timeout=HEARTBEAT_SECONDS):
+            break  # otherwise _advance() already skipped this number
+    ticket = _place(Ticket(doctor_id, number, key), _advance(doctor_id))
+    ADMISSION_DECISIONS.inc(outcome='admitted' if ticket.admitted else 'queued')
+    return ticket
+
+
+def resume(doctor_id, number, key):
+    """The caller's ticket, refreshed and re-placed, or None if it is unknown or expired."""
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        return None
+    holder_key = _key(doctor_id, 'holder', number)
+    if not key or cache.get(holder_key) != key or cache.get(_key(doctor_id, 'ended', number)):
+        return None
+    cache.touch(holder_key, HEARTBEAT_SECONDS)
+    return _place(Ticket(doctor_id, number, key), _advance(doctor_id))
+
+
+def release(ticket):
+    """Finish an admitted ticket so the next one in line is let in."""
+    cache.set(_key(ticket.doctor_id, 'ended', ticket.number), 1, timeout=STATE_TIMEOUT)
+    _advance(ticket.doctor_id)
@@ -0,0 +1,216 @@
+import math
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, DatabaseError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from availability.models import TimeSlot
+from bookings.models import Booking
+
+PREFIX = 'loadtest-'
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class LockWaitTimer:
+    """execute_wrapper that accumulates time spent in slot-claiming statements.
+
+    The conditional UPDATE and SELECT ... FOR UPDATE are where a request
+    blocks on another transaction's row lock, so their duration is the
+    closest client-side measure of lock wait. Every statement is counted.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.statements = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements += 1
+        claiming = sql.startswith(f'UPDATE "{TimeSlot._meta.db_table}"') or 'FOR UPDATE' in sql
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if claiming:
+                self.elapsed += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer the booking path from concurrent threads and report throughput, latency percentiles, '
+        'lock wait and the double-booking invariant.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=2000, help='Total booking attempts across threads')
+        parser.add_argument('--slots', type=int, default=200, help='Slots published for the run')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Zipf exponent for picking slots; 0 is uniform, higher concentrates on hot slots')
+        parser.add_argument('--mode', choices=['model', 'view', 'next'], default='model',
+                            help='model: Booking.create_for_slot, view: POST create_booking, '
+                                 'next: Booking.book_next_available')
+        parser.add_argument('--no-admission', action='store_true',
+                            help='view mode: disable admission control, so every attempt goes to the database')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, slots and bookings')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['slots'] < 1:
+            raise CommandError('--threads and --slots must be positive')
+        doctor, patients, slot_ids = self.setup(options['threads'], options['slots'])
+        try:
+            with override_settings(BOOKING_ADMISSION=not options['no_admission']):
+                results = self.run(doctor, patients, slot_ids, options)
+            self.report(results, slot_ids, options)
+        finally:
+            if not options['keep']:
+                self.teardown()
+
+    def setup(self, threads, slots):
+        from users.models import User
+        self.teardown()
+        doctor = User.objects.create(username=f'{PREFIX}doctor', role=User.DOCTOR, email='doctor@loadtest.invalid')
+        patients = [
+            User.objects.create(username=f'{PREFIX}patient-{i}', role=User.PATIENT, email=f'p{i}@loadtest.invalid')
+            for i in range(threads)
+        ]
+        start = timezone.now() + timedelta(days=1)
+        TimeSlot.objects.bulk_create([
+            TimeSlot(doctor=doctor, start=start + timedelta(minutes=15 * i), end=start + timedelta(minutes=15 * (i + 1)))
+            for i in range(slots)
+        ])
+        slot_ids = list(TimeSlot.objects.filter(doctor=doctor).order_by('start').values_list('id', flat=True))
+        return doctor, patients, slot_ids
+
+    def teardown(self):
+        from users.models import User
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+    def run(self, doctor, patients, slot_ids, options):
+        rng = random.Random(options['seed'])
+        # Zipf-like weights: slot i is picked with probability ~ 1 / (i + 1) ** skew.
+        weights = [1 / (i + 1) ** options['skew'] for i in range(len(slot_ids))]
+        plan = rng.choices(slot_ids, weights=weights, k=options['attempts'])
+        plan_lock = threading.Lock()
+        results = []
+        results_lock = threading.Lock()
+        barrier = threading.Barrier(len(patients))
+
+        def worker(patient):
+            client = None
+            if options['mode'] == 'view':
+                client = Client()
+                client.force_login(patient)
+            timer = LockWaitTimer()
+            local = []
+            barrier.wait()
+            try:
+                with connection.execute_wrapper(timer):
+                    while True:
+                        with plan_lock:
+                            if not plan:
+                                break
+                            slot_id = plan.pop()
+                        timer.elapsed = 0.0
+                        timer.statements = 0
+                        started = time.perf_counter()
+                        outcome = self.attempt(options['mode'], client, doctor, patient, slot_id)
+                        local.append((outcome, time.perf_counter() - started, timer.elapsed, timer.statements))
+            finally:
+                connection.close()
+            with results_lock:
+                results.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(p,)) for p in patients]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.wall_time = time.perf_counter() - started
+        return results
+
+    def attempt(self, mode, client, doctor, patient, slot_id):
+        try:
+            if mode == 'model':
+                Booking.create_for_slot(slot_id, patient)
+            elif mode == 'next':
+                Booking.book_next_available(doctor.pk, patient)
+            else:
+                return self.post_booking(client, doctor, slot_id)
+            return 'booked'
+        except ValueError:
+            return 'conflict'
+        except DatabaseError as exc:
+            # SQLite serializes writers, so concurrent runs there mostly
+            # surface 'database is locked'; use PostgreSQL for real numbers.
+            self.first_error = getattr(self, 'first_error', None) or repr(exc)
+            return 'error'
+
+    def post_booking(self, client, doctor, slot_id):
+        """POST create_booking like the browser does, waiting in the virtual queue when told to."""
+        url = f'/bookings/create/{slot_id}/'
+        response = client.post(url)
+        while response.status_code == 202:
+            page = response.content.decode()
+            ticket = re.search(r'name="ticket" value="(\d+)"', page).group(1)
+            key = re.search(r'name="ticket_key" value="([^"]+)"', page).group(1)
+            position_url = reverse('booking_queue_position', args=[doctor.pk, ticket])
+            while True:
+                time.sleep(0.01)
+                status = client.get(position_url, {'key': key}).json()['status']
+                if status != 'waiting':
+                    break
+            if status != 'admitted':
+                return 'conflict'
+            response = client.post(url, {'ticket': ticket, 'ticket_key': key})
+        return 'booked' if response.status_code == 200 else 'conflict'
+
+    def report(self, results, slot_ids, options):
+        latencies = [r[1] for r in results]
+        lock_waits = [r[2] for r in results]
+        outcomes = {name: sum(1 for r in results if r[0] == name) for name in ('booked', 'conflict', 'error')}
+        self.stdout.write(
+            f"mode={options['mode']} threads={options['threads']} slots={len(slot_ids)} skew={options['skew']} "
+            f"admission={'off' if options['no_admission'] else 'on'}"
+        )
+        self.stdout.write(
+            f'attempts={len(results)} wall={self.wall_time:.2f}s throughput={len(results) / self.wall_time:.1f} req/s'
+        )
+        self.stdout.write(
+            f"booked={outcomes['booked']} conflicts={outcomes['conflict']} errors={outcomes['error']}"
+        )
+        if outcomes['error']:
+            self.stdout.write(self.style.WARNING(f'first error: {self.first_error}'))
+        for label, values in (('latency', latencies), ('lock wait', lock_waits)):
+            self.stdout.write(
+                f'{label:<10} p50={percentile(values, 50) * 1000:.2f}ms p95={percentile(values, 95) * 1000:.2f}ms '
+                f'p99={percentile(values, 99) * 1000:.2f}ms max={max(values, default=0) * 1000:.2f}ms'
+            )
+        self.stdout.write(f'total lock wait={sum(lock_waits):.3f}s')
+        statements = sum(r[3] for r in results)
+        self.stdout.write(f'db statements={statements} ({statements / max(len(results), 1):.1f} per attempt)')
+
+        bookings = Booking.objects.filter(slot_id__in=slot_ids)
+        doubled = bookings.values('slot_id').annotate(n=Count('id')).filter(n__gt=1).count()
+        booked_slots = TimeSlot.objects.filter(pk__in=slot_ids, is_booked=True).count()
+        ok = doubled == 0 and booked_slots == bookings.count() == outcomes['booked']
+        line = (
+            f'invariant: bookings={bookings.count()} booked_slots={booked_slots} '
+            f"reported_successes={outcomes['booked']} double_booked_slots={doubled}"
+        )
+        self.stdout.write(self.style.SUCCESS(line + ' OK') if ok else self.style.ERROR(line + ' VIOLATED'))
+        if not ok:
+            raise CommandError('Double-booking invariant violated')
@@ -0,0 +1,29 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from bookings.outbox import dispatch_batch, BATCH_SIZE
+from bookings.utils import get_notification_client
+
+
+class Command(BaseCommand):
+    help = 'Drain the notification outbox with a thread pool, retrying with backoff and dead-lettering failures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent deliveries')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows claimed per batch')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is due now and exit')
+
+    def handle(self, *args, **options):
+        total = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                processed = dispatch_batch(executor, options['batch_size'])
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} notifications'))
+        self.stdout.write(f'client: {get_notification_client().stats.snapshot()}')
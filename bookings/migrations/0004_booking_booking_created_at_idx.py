@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0008_timeslot_timeslot_start_idx'),
+        ('bookings', '0003_notificationoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at'], name='booking_created_at_idx'),
+        ),
+    ]
@@ -1,6 +1,20 @@
+import time
 from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from availability.models import TimeSlot
+from calendar_integration.models import CalendarSyncJob
+from hms import metrics
+
+BOOKING_SECONDS = metrics.histogram(
+    'hms_booking_seconds', 'Booking transaction time including commit', ['path', 'outcome'],
+)
+# create_for_slot claims with one conditional UPDATE, so its row-lock wait
+# and the write itself are a single 'claim' phase; book_next_available
+# locks with SELECT ... FOR UPDATE ('lock_wait') before its 'update'.
+BOOKING_PHASE_SECONDS = metrics.histogram(
+    'hms_booking_phase_seconds', 'Time spent in each statement group of a booking', ['path', 'phase'],
+)
 
 
 class Booking(models.Model):
@@ -8,17 +22,148 @@ class Booking(models.Model):
     patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bookings')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Admin date_hierarchy on created_at.
+            models.Index(fields=['created_at'], name='booking_created_at_idx'),
+        ]
+
     def __str__(self):
         return f"Booking: {self.patient.username} with {self.slot}"
 
     @classmethod
     def create_for_slot(cls, slot_id, patient):
-        """Atomically create a booking for a timeslot if it's not already booked."""
-        with transaction.atomic():
-            slot = TimeSlot.objects.select_for_update().get(pk=slot_id)
-            if slot.is_booked:
-                raise ValueError('Slot already booked')
-            slot.is_booked = True
-            slot.save()
-            booking = cls.objects.create(slot=slot, patient=patient)
+        """Atomically create a booking for a timeslot if it's not already booked.
+
+        The slot is claimed with a single conditional UPDATE (`... WHERE
+        NOT is_booked AND NOT blocked`) and the affected row count decides
+        the winner, so there is no SELECT ... FOR UPDATE round-trip before
+        the write.
+
+        Confirmation emails and calendar events are queued in the same
+        transaction and delivered later by `dispatch_notifications` and
+        `run_calendar_sync`.
+        """
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            with transaction.atomic():
+                with BOOKING_PHASE_SECONDS.time(path='slot', phase='claim'):
+                    claimed = TimeSlot.objects.filter(pk=slot_id, is_booked=False, blocked=False).update(is_booked=True)
+                if not claimed:
+                    if not TimeSlot.objects.filter(pk=slot_id).exists():
+                        outcome = 'not_found'
+                        raise TimeSlot.DoesNotExist('Time slot not found')
+                    outcome = 'conflict'
+                    raise ValueError('Slot already booked')
+                with BOOKING_PHASE_SECONDS.time(path='slot', phase='load'):
+                    slot = TimeSlot.objects.select_related('doctor').get(pk=slot_id)
+                booking = cls._create_claimed(slot, patient, path='slot')
+            outcome = 'booked'
             return booking
+        finally:
+            BOOKING_SECONDS.observe(time.perf_counter() - started, path='slot', outcome=outcome)
+
+    @classmethod
+    def book_next_available(cls, doctor_id, patient, window_start=None, window_end=None):
+        """Book the doctor's earliest free slot starting inside [window_start, window_end).
+
+        Candidate rows are locked with FOR UPDATE SKIP LOCKED, so concurrent
+        patients each take a different slot instead of queueing on the same
+        row. Raises ValueError if no free slot is left in the window.
+        """
+        now = timezone.now()
+        window_start = max(window_start, now) if window_start else now
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            with transaction.atomic():
+                candidates = (
+                    TimeSlot.objects
+                    .select_related('doctor')
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .filter(doctor_id=doctor_id, is_booked=False, blocked=False, start__gt=window_start)
+                    .order_by('start')
+                )
+                if window_end:
+                    candidates = candidates.filter(start__lt=window_end)
+                with BOOKING_PHASE_SECONDS.time(path='next', phase='lock_wait'):
+                    slot = candidates.first()
+                if slot is None:
+                    outcome = 'conflict'
+                    raise ValueError('No free slot available')
+                with BOOKING_PHASE_SECONDS.time(path='next', phase='update'):
+                    TimeSlot.objects.filter(pk=slot.pk).update(is_booked=True)
+                slot.is_booked = True
+                booking = cls._create_claimed(slot, patient, path='next')
+            outcome = 'booked'
+            return booking
+        finally:
+            BOOKING_SECONDS.observe(time.perf_counter() - started, path='next', outcome=outcome)
+
+    @classmethod
+    def _create_claimed(cls, slot, patient, path):
+        """Insert the booking and queue its side effects; call inside the claiming transaction."""
+        with BOOKING_PHASE_SECONDS.time(path=path, phase='insert'):
+            booking = cls.objects.create(slot=slot, patient=patient)
+            NotificationOutbox.enqueue_booking_confirmation(booking)
+            CalendarSyncJob.enqueue_for_booking(booking)
+        return booking
+
+    def confirmation_message(self):
+        """Return (subject, body) for the confirmation sent to patient and doctor."""
+        doctor = self.slot.doctor
+        subject = f'Appointment with Dr. {doctor.get_full_name()}'
+        body = (
+            f"Appointment confirmed:\nPatient: {self.patient.get_full_name()}\n"
+            f"Doctor: {doctor.get_full_name()}\nStart: {self.slot.start}\nEnd: {self.slot.end}"
+        )
+        return subject, body
+
+
+class NotificationOutbox(models.Model):
+    """Email notification written in the booking transaction and delivered asynchronously."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead letter'),
+    ]
+
+    action = models.CharField(max_length=50)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        verbose_name = 'Outbox Notification'
+        verbose_name_plural = 'Outbox Notifications'
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='outbox_pending_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.action} to {self.to_email} ({self.status})"
+
+    @classmethod
+    def enqueue_booking_confirmation(cls, booking):
+        """Queue confirmation emails for the booking's patient and doctor."""
+        subject, body = booking.confirmation_message()
+        recipients = [booking.patient.email, booking.slot.doctor.email]
+        return cls.objects.bulk_create([
+            cls(action='BOOKING_CONFIRMATION', to_email=email, subject=subject, body=body)
+            for email in recipients if email
+        ])
@@ -0,0 +1,76 @@
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from hms.utils import backoff_delay
+from .models import NotificationOutbox
+from .utils import CIRCUIT_OPEN_ERROR, get_notification_client, send_email_notification
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+# A claimed row is invisible to other dispatchers for this long; if the
+# dispatcher dies mid-batch the row becomes due again afterwards.
+LEASE_SECONDS = 60
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """Lease up to `batch_size` due notifications; concurrent dispatchers skip locked rows."""
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if entries:
+            NotificationOutbox.objects.filter(pk__in=[e.pk for e in entries]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+            )
+    return entries
+
+
+def deliver(entry):
+    """Send one notification; return None on success or the error message."""
+    result = send_email_notification(entry.action, entry.to_email, subject=entry.subject, body=entry.body)
+    return result.get('error') if isinstance(result, dict) else None
+
+
+def record_failure(entry, error):
+    if error == CIRCUIT_OPEN_ERROR:
+        # Never attempted: retry once the breaker lets a probe through,
+        # without spending one of the entry's attempts.
+        delay = max(get_notification_client().breaker.retry_after(), 1.0)
+        entry.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        entry.save(update_fields=['next_attempt_at'])
+        return
+    entry.attempts += 1
+    entry.last_error = error
+    if entry.attempts >= MAX_ATTEMPTS:
+        entry.status = NotificationOutbox.DEAD
+        logger.error(f'Notification {entry.pk} dead-lettered after {entry.attempts} attempts: {error}')
+    else:
+        entry.next_attempt_at = timezone.now() + backoff_delay(entry.attempts, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS)
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def dispatch_batch(executor, batch_size=BATCH_SIZE):
+    """Claim and deliver one batch using `executor`; return the number of rows processed."""
+    entries = claim_batch(batch_size)
+    if not entries:
+        return 0
+    errors = list(executor.map(deliver, entries))
+    sent = [entry.pk for entry, error in zip(entries, errors) if error is None]
+    if sent:
+        NotificationOutbox.objects.filter(pk__in=sent).update(
+            status=NotificationOutbox.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+    for entry, error in zip(entries, errors):
+        if error is not None:
+            record_failure(entry, error)
+    return len(entries)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from availability.signals import slots_published
+from . import admission
+from .models import Booking
+
+
+@receiver(slots_published)
+def recount_free_slots(sender, doctor_id, slot_ids=None, **kwargs):
+    if settings.BOOKING_ADMISSION:
+        admission.slots_published(doctor_id, slot_ids)
+
+
+@receiver(post_save, sender=Booking)
+def booking_created(sender, instance, created, **kwargs):
+    if created and settings.BOOKING_ADMISSION:
+        doctor_id = instance.slot.doctor_id
+        transaction.on_commit(lambda: admission.recount(doctor_id))
+
+
+@receiver(post_delete, sender=Booking)
+def booking_cancelled(sender, instance, **kwargs):
+    if settings.BOOKING_ADMISSION:
+        doctor_id, slot_id = instance.slot.doctor_id, instance.slot_id
+        transaction.on_commit(lambda: admission.forget_taken(doctor_id, [slot_id]))
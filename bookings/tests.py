@@ -0,0 +1,231 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+import httpx
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from availability.models import TimeSlot
+from users.models import User
+from . import admission
+from .models import Booking
+from .utils import AsyncNotificationClient, get_notification_client
+
+
+def make_slots(doctor, count, **fields):
+    start = timezone.now() + timedelta(days=1)
+    return [
+        TimeSlot.objects.create(doctor=doctor, start=start + timedelta(hours=n), end=start + timedelta(hours=n, minutes=30), **fields)
+        for n in range(count)
+    ]
+
+
+class DoubleBookingTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        self.patients = [User.objects.create(username=f'pat{n}', role=User.PATIENT) for n in range(2)]
+
+    def test_slot_is_booked_once(self):
+        slot, = make_slots(self.doctor, 1)
+        Booking.create_for_slot(slot.pk, self.patients[0])
+        with self.assertRaises(ValueError):
+            Booking.create_for_slot(slot.pk, self.patients[1])
+        self.assertEqual(Booking.objects.filter(slot=slot).get().patient, self.patients[0])
+
+    def test_blocked_slot_cannot_be_booked(self):
+        slot, = make_slots(self.doctor, 1, blocked=True)
+        with self.assertRaises(ValueError):
+            Booking.create_for_slot(slot.pk, self.patients[0])
+        with self.assertRaises(ValueError):
+            Booking.book_next_available(self.doctor.pk, self.patients[0])
+
+    def test_next_available_takes_each_slot_once(self):
+        slots = make_slots(self.doctor, 2)
+        booked = [Booking.book_next_available(self.doctor.pk, patient).slot_id for patient in self.patients]
+        self.assertEqual(booked, [s.pk for s in slots])
+        with self.assertRaises(ValueError):
+            Booking.book_next_available(self.doctor.pk, self.patients[0])
+
+    def test_second_booking_request_is_refused(self):
+        slot, = make_slots(self.doctor, 1)
+        for patient in self.patients:
+            self.client.force_login(patient)
+            response = self.client.post(reverse('create_booking', args=[slot.pk]), follow=True)
+        self.assertContains(response, 'Time slot already booked')
+        self.assertEqual(Booking.objects.filter(slot=slot).count(), 1)
+
+    def test_next_available_accepts_naive_window(self):
+        slot, = make_slots(self.doctor, 1)
+        self.client.force_login(self.patients[0])
+        start = timezone.localtime(slot.start - timedelta(hours=1)).replace(tzinfo=None)
+        response = self.client.post(reverse('book_next_available', args=[self.doctor.pk]), {'start': start.isoformat()})
+        self.assertContains(response, 'Booking confirmed')
+        self.assertEqual(Booking.objects.get().slot, slot)
+
+    def test_next_available_rejects_invalid_window(self):
+        make_slots(self.doctor, 1)
+        self.client.force_login(self.patients[0])
+        response = self.client.post(reverse('book_next_available', args=[self.doctor.pk]), {'start': '2026-13-40T10:00:00'})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertFalse(Booking.objects.exists())
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_racing_patients_book_a_slot_once(self):
+        doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        patients = [User.objects.create(username=f'pat{n}', role=User.PATIENT) for n in range(8)]
+        slot, = make_slots(doctor, 1)
+        barrier = threading.Barrier(len(patients))
+        outcomes = []
+
+        def book(patient):
+            barrier.wait()
+            try:
+                Booking.create_for_slot(slot.pk, patient)
+                outcomes.append('booked')
+            except ValueError:
+                outcomes.append('conflict')
+            except DatabaseError:
+                # SQLite's shared in-memory test database locks whole tables.
+                outcomes.append('error')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(outcomes.count('booked'), 1)
+        if connection.vendor == 'postgresql':
+            self.assertEqual(outcomes.count('conflict'), 7)
+        self.assertEqual(Booking.objects.filter(slot=slot).count(), 1)
+
+
+@override_settings(BOOKING_ADMISSION=True)
+class AdmissionCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        self.patient = User.objects.create(username='pat', role=User.PATIENT)
+        start = timezone.now() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slots = [
+                TimeSlot.objects.create(doctor=self.doctor, start=start + timedelta(hours=n), end=start + timedelta(hours=n, minutes=30))
+                for n in range(2)
+            ]
+
+    def test_booking_recounts_on_commit(self):
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_for_slot(self.slots[0].pk, self.patient)
+        with self.assertNumQueries(0):
+            self.assertEqual(admission.free_slot_count(self.doctor.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_for_slot(self.slots[1].pk, self.patient)
+        self.assertEqual(admission.refusal(self.doctor.pk), admission.SOLD_OUT)
+
+    def test_published_slot_recounts_and_clears_taken(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_for_slot(self.slots[0].pk, self.patient)
+        admission.note_taken(self.doctor.pk, self.slots[0].pk)
+        # Unrelated changes to the doctor's slots keep the marker.
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.create_for_slot(self.slots[1].pk, self.patient)
+        self.assertEqual(admission.refusal(self.doctor.pk, self.slots[0].pk), admission.TAKEN)
+
+        slot = self.slots[0]
+        slot.booking.delete()
+        slot.is_booked = False
+        with self.captureOnCommitCallbacks(execute=True):
+            slot.save()
+        self.assertIsNone(admission.refusal(self.doctor.pk, slot.pk))
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 1)
+
+
+    def test_booking_seen_by_an_earlier_recount_is_not_subtracted_twice(self):
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Booking.create_for_slot(self.slots[0].pk, self.patient)
+        # A slot published in between already counts the booking.
+        admission.slots_published(self.doctor.pk)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 1)
+
+
+@override_settings(BOOKING_ADMISSION=True)
+@mock.patch.object(admission, 'CONCURRENCY', 1)
+class AdmissionQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+
+    def expire(self, ticket):
+        # What the cache does when the holder stops polling.
+        cache.delete(admission._key(ticket.doctor_id, 'holder', ticket.number))
+
+    def position(self, ticket):
+        url = reverse('booking_queue_position', args=[ticket.doctor_id, ticket.number])
+        return self.client.get(url, {'key': ticket.key})
+
+    def test_tickets_are_admitted_in_order(self):
+        tickets = [admission.take(self.doctor.pk) for _ in range(3)]
+        self.assertEqual([(t.admitted, t.position) for t in tickets], [(True, 0), (False, 1), (False, 2)])
+
+        admission.release(tickets[0])
+        second = admission.resume(self.doctor.pk, tickets[1].number, tickets[1].key)
+        third = admission.resume(self.doctor.pk, tickets[2].number, tickets[2].key)
+        self.assertEqual((second.admitted, second.position), (True, 0))
+        self.assertEqual((third.admitted, third.position), (False, 1))
+
+    def test_resume_needs_the_ticket_key(self):
+        ticket = admission.take(self.doctor.pk)
+        self.assertIsNone(admission.resume(self.doctor.pk, ticket.number, 'wrong'))
+        self.assertIsNone(admission.resume(self.doctor.pk, 'x', ticket.key))
+        admission.release(ticket)
+        self.assertIsNone(admission.resume(self.doctor.pk, ticket.number, ticket.key))
+
+    def test_abandoned_tickets_expire(self):
+        admitted, waiting, last = [admission.take(self.doctor.pk) for _ in range(3)]
+        self.expire(admitted)
+        self.expire(waiting)
+
+        current = admission.resume(self.doctor.pk, last.number, last.key)
+        self.assertEqual((current.admitted, current.position), (True, 0))
+        # An expired ticket cannot come back and jump the queue.
+        self.assertIsNone(admission.resume(self.doctor.pk, waiting.number, waiting.key))
+        self.assertEqual(self.position(waiting).json(), {'status': admission.EXPIRED})
+
+    def test_queue_position_reports_status(self):
+        make_slots(self.doctor, 1)
+        admitted, waiting = admission.take(self.doctor.pk), admission.take(self.doctor.pk)
+        self.assertEqual(self.position(admitted).json(), {'status': 'admitted', 'position': 0})
+        self.assertEqual(self.position(waiting).json(), {'status': 'waiting', 'position': 1})
+
+    def test_sold_out_releases_waiting_ticket(self):
+        admitted, waiting = admission.take(self.doctor.pk), admission.take(self.doctor.pk)
+        self.assertEqual(self.position(waiting).json(), {'status': admission.SOLD_OUT})
+        self.assertIsNone(admission.resume(self.doctor.pk, waiting.number, waiting.key))
+
+        # Its place is given up: the next ticket follows the admitted one.
+        admission.release(admitted)
+        self.assertTrue(admission.take(self.doctor.pk).admitted)
+
+
+class AsyncNotificationClientTests(TestCase):
+    def test_shares_breaker_and_stats_with_sync_client(self):
+        shared = get_notification_client()
+        client = AsyncNotificationClient()
+        self.assertIs(client.breaker, shared.breaker)
+        self.assertIs(client.stats, shared.stats)
+        self.assertEqual((client.url, client.timeout), (shared.url, shared.timeout))
+        self.assertFalse(hasattr(client, 'session'))
+
+    def test_send(self):
+        client = AsyncNotificationClient(url='http://notify.test/send')
+        client.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={'status': 'sent'})))
+        self.assertEqual(async_to_sync(client.send)('SIGNUP_WELCOME', 'a@example.com'), {'status': 'sent'})
@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('create/<int:slot_id>/', views.create_booking, name='create_booking'),
+    path(
+        'create/<int:slot_id>/',
+        views.create_booking_async if settings.HMS_ASYNC_VIEWS else views.create_booking,
+        name='create_booking',
+    ),
+    path('next/<int:doctor_id>/', views.book_next_available, name='book_next_available'),
+    path('queue/<int:doctor_id>/<int:ticket>/', views.queue_position, name='booking_queue_position'),
 ]
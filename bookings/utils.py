@@ -1,28 +1,252 @@
 import os
-import json
+import asyncio
 import logging
+import threading
+import time
+import weakref
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from hms import metrics
 
 logger = logging.getLogger(__name__)
 
+CONNECT_TIMEOUT = float(os.getenv('NOTIFICATION_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.getenv('NOTIFICATION_TIMEOUT', '5'))
+POOL_SIZE = int(os.getenv('NOTIFICATION_POOL_SIZE', '10'))
+# One event loop can have many more calls in flight than a thread pool.
+ASYNC_POOL_SIZE = int(os.getenv('NOTIFICATION_ASYNC_POOL_SIZE', '100'))
+# Consecutive failures that open the circuit, and how long it stays open
+# before a single probe request is let through.
+FAILURE_THRESHOLD = int(os.getenv('NOTIFICATION_FAILURE_THRESHOLD', '5'))
+RESET_SECONDS = float(os.getenv('NOTIFICATION_RESET_SECONDS', '30'))
 
-def send_email_notification(action: str, to_email: str, subject: str = None, body: str = None):
-    """Send a notification to the serverless email endpoint.
-    
-    Looks for `SERVERLESS_EMAIL_URL` in env, falls back to http://localhost:3000/send
+CIRCUIT_OPEN_ERROR = 'circuit open'
+
+NOTIFICATION_SECONDS = metrics.histogram(
+    'hms_notification_seconds', 'Latency of calls to the email endpoint', ['outcome'],
+)
+NOTIFICATION_SHORT_CIRCUITED = metrics.counter(
+    'hms_notification_short_circuited_total', 'Notifications refused by the open circuit breaker',
+)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; open -> half-open after `reset_seconds`.
+
+    While half-open exactly one caller is allowed through as a probe: its
+    success closes the circuit, its failure re-opens it for another period.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f'Notification circuit opened after {self.failures} failures')
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class ClientStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = self.errors = self.short_circuited = 0
+            self.total_seconds = self.max_seconds = 0.0
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def record_short_circuit(self):
+        with self._lock:
+            self.short_circuited += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'short_circuited': self.short_circuited,
+                'avg_ms': self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+                'max_ms': self.max_seconds * 1000,
+            }
+
+
+class NotificationClient:
+    """Client for the serverless email endpoint shared by every caller in the process.
+
+    Requests go through one keep-alive `requests.Session` (a connection
+    pool of `pool_size`) and a circuit breaker, so during an outage callers
+    fail immediately instead of each waiting for the timeout.
     """
-    url = os.getenv('SERVERLESS_EMAIL_URL', 'http://localhost:3000/send')
-    payload = {
+
+    def __init__(self, url=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=POOL_SIZE, breaker=None, stats=None):
+        self.url = url or os.getenv('SERVERLESS_EMAIL_URL', 'http://localhost:3000/send')
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = stats or ClientStats()
+        self._open_transport(pool_size)
+
+    def _open_transport(self, pool_size):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _short_circuited(self):
+        """True (and counted) if the breaker refuses the call."""
+        if self.breaker.allow():
+            return False
+        self.stats.record_short_circuit()
+        NOTIFICATION_SHORT_CIRCUITED.inc()
+        return True
+
+    def _record(self, started, action, error=None):
+        elapsed = time.perf_counter() - started
+        self.stats.record(elapsed, error=error is not None)
+        NOTIFICATION_SECONDS.observe(elapsed, outcome='error' if error is not None else 'sent')
+        if error is not None:
+            self.breaker.record_failure()
+            logger.warning(f'Failed sending {action} notification: {error}')
+        else:
+            self.breaker.record_success()
+
+    def send(self, action, to_email, subject=None, body=None):
+        """POST one notification; return the response JSON or {'error': message}."""
+        if self._short_circuited():
+            return {'error': CIRCUIT_OPEN_ERROR}
+        payload = _payload(action, to_email, subject, body)
+        started = time.perf_counter()
+        try:
+            resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+            resp.raise_for_status()
+        except requests.RequestException as exc:
+            self._record(started, action, error=exc)
+            return {'error': str(exc)}
+        self._record(started, action)
+        return _json_or_empty(resp)
+
+
+class AsyncNotificationClient(NotificationClient):
+    """httpx.AsyncClient counterpart of NotificationClient for async views.
+
+    Shares the circuit breaker and stats of the process-wide sync client,
+    so an outage seen by either path opens the circuit for both.
+    """
+
+    def __init__(self, url=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=ASYNC_POOL_SIZE, breaker=None):
+        shared = get_notification_client()
+        super().__init__(url or shared.url, timeout, pool_size, breaker or shared.breaker, shared.stats)
+
+    def _open_transport(self, pool_size):
+        connect, read = self.timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def send(self, action, to_email, subject=None, body=None):
+        if self._short_circuited():
+            return {'error': CIRCUIT_OPEN_ERROR}
+        started = time.perf_counter()
+        try:
+            resp = await self.client.post(self.url, json=_payload(action, to_email, subject, body))
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            self._record(started, action, error=exc)
+            return {'error': str(exc)}
+        self._record(started, action)
+        return _json_or_empty(resp)
+
+
+def _payload(action, to_email, subject, body):
+    return {
         'action': action,
         'to': to_email,
         'subject': subject or f'HMS: {action}',
         'body': body or '',
     }
-    headers = {'Content-Type': 'application/json'}
+
+
+def _json_or_empty(resp):
     try:
-        resp = requests.post(url, data=json.dumps(payload), headers=headers, timeout=5)
-        resp.raise_for_status()
         return resp.json() if resp.text else {}
-    except Exception as exc:
-        logger.exception('Failed sending email notification')
-        return {'error': str(exc)}
+    except ValueError:
+        return {}
+
+
+_client = None
+_client_lock = threading.Lock()
+# httpx connections belong to the event loop that opened them.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_notification_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = NotificationClient()
+    return _client
+
+
+def send_email_notification(action: str, to_email: str, subject: str = None, body: str = None):
+    """Send a notification to the serverless email endpoint.
+
+    Looks for `SERVERLESS_EMAIL_URL` in env, falls back to http://localhost:3000/send.
+    Returns {'error': ...} instead of raising; the error is CIRCUIT_OPEN_ERROR
+    when the request was not attempted because the endpoint is failing.
+    """
+    return get_notification_client().send(action, to_email, subject=subject, body=body)
+
+
+def get_async_notification_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncNotificationClient()
+    return client
+
+
+async def asend_email_notification(action: str, to_email: str, subject: str = None, body: str = None):
+    """Async send_email_notification(); awaiting it does not block the event loop."""
+    return await get_async_notification_client().send(action, to_email, subject=subject, body=body)
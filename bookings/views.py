@@ -1,10 +1,85 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+from . import admission
 from .models import Booking
 from availability.models import TimeSlot
-from .utils import send_email_notification
-from calendar_integration.utils import create_appointment_events
+from availability.pagination import parse_moment
+from hms import metrics
+
+BOOKING_CONFLICTS = metrics.counter(
+    'hms_booking_conflicts_total', 'Booking requests refused because the slot was taken', ['path'],
+)
+
+REFUSAL_MESSAGES = {
+    admission.TAKEN: 'Time slot already booked',
+    admission.SOLD_OUT: 'No free slots available for this doctor',
+}
+
+
+def _admit(request, doctor_id=None, slot_id=None):
+    """Pass a booking attempt through admission control (bookings/admission.py).
+
+    Returns (ticket, None) when the attempt may go to the database (the
+    ticket is None with BOOKING_ADMISSION off) and must be released
+    afterwards, or (None, response) when it was refused or queued.
+    """
+    if not settings.BOOKING_ADMISSION:
+        return None, None
+    if doctor_id is None:
+        doctor_id = admission.slot_doctor(slot_id)
+        if doctor_id is None:
+            messages.error(request, 'Time slot not found')
+            return None, redirect('/')
+    ticket = admission.resume(doctor_id, request.POST.get('ticket'), request.POST.get('ticket_key'))
+    reason = admission.refusal(doctor_id, slot_id)
+    if reason is not None:
+        if ticket is not None:
+            admission.release(ticket)
+        messages.error(request, REFUSAL_MESSAGES[reason])
+        return None, redirect('/')
+    ticket = ticket or admission.take(doctor_id)
+    if not ticket.admitted:
+        return None, _queued(request, ticket)
+    return ticket, None
+
+
+def _queued(request, ticket):
+    """202 page that polls the ticket's position and resubmits the booking when it is admitted."""
+    context = {
+        'ticket': ticket,
+        'action': request.path,
+        'fields': [(k, v) for k, v in request.POST.items() if k not in ('csrfmiddlewaretoken', 'ticket', 'ticket_key')],
+        'position_url': reverse('booking_queue_position', args=[ticket.doctor_id, ticket.number]),
+        'poll_ms': admission.POLL_SECONDS * 1000,
+    }
+    response = render(request, 'bookings/queued.html', context, status=202)
+    response['Retry-After'] = str(admission.POLL_SECONDS)
+    return response
+
+
+@require_GET
+def queue_position(request, doctor_id, ticket):
+    """JSON status of a queued booking attempt, polled by the queued page.
+
+    The ticket's secret authenticates the caller, so polling touches
+    neither the session nor the user table.
+    """
+    current = admission.resume(doctor_id, ticket, request.GET.get('key'))
+    if current is None:
+        return JsonResponse({'status': admission.EXPIRED}, status=404)
+    if admission.free_slot_count(doctor_id) <= 0:
+        admission.release(current)
+        return JsonResponse({'status': admission.SOLD_OUT})
+    return JsonResponse({
+        'status': 'admitted' if current.admitted else 'waiting',
+        'position': current.position,
+    })
 
 
 @login_required
@@ -15,38 +90,94 @@ def create_booking(request, slot_id):
         messages.error(request, 'Only patients can book slots')
         return redirect('/')
 
+    ticket, response = _admit(request, slot_id=slot_id)
+    if response is not None:
+        return response
     try:
         booking = Booking.create_for_slot(slot_id=slot_id, patient=user)
     except TimeSlot.DoesNotExist:
         messages.error(request, 'Time slot not found')
         return redirect('/')
     except ValueError:
+        BOOKING_CONFLICTS.inc(path='slot')
+        if ticket is not None:
+            admission.note_taken(ticket.doctor_id, slot_id)
+        messages.error(request, 'Time slot already booked')
+        return redirect('/')
+    finally:
+        if ticket is not None:
+            admission.release(ticket)
+
+    # Confirmation emails and calendar events were queued in the booking
+    # transaction and are delivered by the background workers.
+    messages.success(request, 'Booking confirmed')
+
+    return render(request, 'bookings/booking_confirmed.html', {'booking': booking})
+
+
+@login_required
+async def create_booking_async(request, slot_id):
+    """create_booking for ASGI deployments.
+
+    The booking transaction runs in sync_to_async (the async ORM cannot
+    hold a transaction), on the thread-sensitive executor so database
+    connections are closed by the request's own lifecycle.
+    """
+    user = await request.auser()
+    if not user.is_patient():
+        messages.error(request, 'Only patients can book slots')
+        return redirect('/')
+
+    ticket, response = await sync_to_async(_admit)(request, slot_id=slot_id)
+    if response is not None:
+        return response
+    try:
+        booking = await sync_to_async(Booking.create_for_slot)(slot_id=slot_id, patient=user)
+    except TimeSlot.DoesNotExist:
+        messages.error(request, 'Time slot not found')
+        return redirect('/')
+    except ValueError:
+        BOOKING_CONFLICTS.inc(path='slot')
+        if ticket is not None:
+            await sync_to_async(admission.note_taken)(ticket.doctor_id, slot_id)
         messages.error(request, 'Time slot already booked')
         return redirect('/')
+    finally:
+        if ticket is not None:
+            await sync_to_async(admission.release)(ticket)
 
     messages.success(request, 'Booking confirmed')
-    
-    # Call serverless email endpoint for patient and doctor notifications (best-effort)
+    return await sync_to_async(render)(request, 'bookings/booking_confirmed.html', {'booking': booking})
+
+
+@login_required
+@require_POST
+def book_next_available(request, doctor_id):
+    """Patient books the doctor's next free slot, optionally within a start/end window."""
+    user = request.user
+    if not user.is_patient():
+        messages.error(request, 'Only patients can book slots')
+        return redirect('/')
+
     try:
-        patient_email = booking.patient.email
-        doctor_email = booking.slot.doctor.email
-        subject = f'Appointment with Dr. {booking.slot.doctor.get_full_name()}'
-        body = (
-            f"Appointment confirmed:\nPatient: {booking.patient.get_full_name()}\n"
-            f"Doctor: {booking.slot.doctor.get_full_name()}\nStart: {booking.slot.start}\nEnd: {booking.slot.end}"
-        )
-        # Fire-and-forget (we don't block booking on email success)
-        send_email_notification('BOOKING_CONFIRMATION', patient_email, subject=subject, body=body)
-        send_email_notification('BOOKING_CONFIRMATION', doctor_email, subject=subject, body=body)
-    except Exception:
-        # ignore email failures but log in server logs
-        pass
-
-    # Create Google Calendar events for both doctor and patient
+        window_start = parse_moment(request.POST.get('start'))
+        window_end = parse_moment(request.POST.get('end'))
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('/')
+
+    ticket, response = _admit(request, doctor_id=doctor_id)
+    if response is not None:
+        return response
     try:
-        create_appointment_events(booking)
-    except Exception:
-        # Google Calendar is optional, don't block booking on calendar failures
-        pass
+        booking = Booking.book_next_available(doctor_id, user, window_start=window_start, window_end=window_end)
+    except ValueError:
+        BOOKING_CONFLICTS.inc(path='next')
+        messages.error(request, 'No free slots available for this doctor')
+        return redirect('/')
+    finally:
+        if ticket is not None:
+            admission.release(ticket)
 
+    messages.success(request, 'Booking confirmed')
     return render(request, 'bookings/booking_confirmed.html', {'booking': booking})
@@ -1,8 +1,31 @@
 from django.contrib import admin
-from .models import GoogleCalendarToken
+from .models import GoogleCalendarToken, CalendarSyncJob, CalendarSyncState, BusyInterval
 
 
 @admin.register(GoogleCalendarToken)
 class GoogleCalendarTokenAdmin(admin.ModelAdmin):
     list_display = ('user', 'expiry', 'created_at', 'updated_at')
     search_fields = ('user__username', 'user__email')
+
+
+@admin.register(CalendarSyncJob)
+class CalendarSyncJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'booking', 'status', 'attempts', 'next_attempt_at', 'completed_at')
+    list_filter = ('status',)
+    list_select_related = ('user', 'booking__patient', 'booking__slot__doctor')
+    raw_id_fields = ('user', 'booking')
+
+
+@admin.register(CalendarSyncState)
+class CalendarSyncStateAdmin(admin.ModelAdmin):
+    list_display = ('user', 'synced_at', 'full_synced_at', 'last_error')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(BusyInterval)
+class BusyIntervalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event_id', 'start', 'end')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
@@ -0,0 +1,247 @@
+"""Import doctors' busy times from Google Calendar and block overlapping slots."""
+import logging
+import time
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from availability.cache import invalidate_doctor
+from availability.models import TimeSlot
+from availability.pagination import parse_moment
+from availability.signals import publish_slots
+from .models import BusyInterval, CalendarSyncState
+from .utils import CALENDAR_REQUEST_SECONDS, calendar_discovery_document, get_credentials
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 2500  # events.list maximum
+# Overlap conditions per UPDATE, so a full sync of a busy calendar does
+# not build one enormous statement.
+RANGES_PER_QUERY = 200
+
+
+class FullSyncRequired(Exception):
+    """Google rejected the sync token (HTTP 410)."""
+
+
+def busy_range(event, now):
+    """(start, end) of an event that blocks time in the future, else None."""
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return None
+    try:
+        start = parse_moment(event['start'].get('dateTime') or event['start'].get('date'))
+        end = parse_moment(event['end'].get('dateTime') or event['end'].get('date'))
+    except (KeyError, ValueError):
+        logger.warning(f'Skipping calendar event {event.get("id")} without a usable time range')
+        return None
+    if start is None or end is None or end <= now or end <= start:
+        return None
+    return start, end
+
+
+def merge_ranges(ranges):
+    """Coalesce overlapping or touching ranges, sorted by start."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+def fetch_changes(service, sync_token='', time_min=None):
+    """Return (events, next_sync_token) over every page of events.list; a full list starts at `time_min`.
+
+    Raises FullSyncRequired when Google expired the token.
+    """
+    params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': PAGE_SIZE}
+    if sync_token:
+        params['syncToken'] = sync_token
+    elif time_min:
+        params['timeMin'] = time_min.isoformat()
+    events = []
+    page_token = None
+    while True:
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            page = service.events().list(**params, pageToken=page_token).execute()
+            outcome = 'ok'
+        except HttpError as error:
+            if error.resp.status == 410:
+                outcome = 'gone'
+                raise FullSyncRequired() from error
+            raise
+        finally:
+            CALENDAR_REQUEST_SECONDS.observe(time.perf_counter() - started, operation='list', outcome=outcome)
+        events.extend(page.get('items', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return events, page.get('nextSyncToken', '')
+
+
+def _overlapping(doctor_id, ranges):
+    """Slots of the doctor overlapping any of `ranges`, one queryset per chunk."""
+    ranges = merge_ranges(ranges)
+    for i in range(0, len(ranges), RANGES_PER_QUERY):
+        condition = Q()
+        for start, end in ranges[i:i + RANGES_PER_QUERY]:
+            condition |= Q(start__lt=end, end__gt=start)
+        yield TimeSlot.objects.filter(doctor_id=doctor_id).filter(condition)
+
+
+def _flip(candidates, blocked):
+    """Set `blocked` on the candidate slots; return the (pk, start) of the slots changed.
+
+    Rows locked by a booking in progress are skipped.
+    """
+    rows = list(candidates.select_for_update(skip_locked=True, of=('self',)).values_list('pk', 'start'))
+    if rows:
+        TimeSlot.objects.filter(pk__in=[pk for pk, _ in rows]).update(blocked=blocked)
+    return rows
+
+
+def _busy_overlap(doctor_id):
+    return BusyInterval.objects.filter(user_id=doctor_id, start__lt=OuterRef('end'), end__gt=OuterRef('start'))
+
+
+def block_slots(doctor_id, ranges, now):
+    changed = []
+    for slots in _overlapping(doctor_id, ranges):
+        changed += _flip(slots.filter(start__gt=now, is_booked=False, blocked=False), True)
+    return changed
+
+
+def release_slots(doctor_id, ranges, now):
+    """Unblock slots in `ranges` that no longer overlap a busy interval."""
+    changed = []
+    for slots in _overlapping(doctor_id, ranges):
+        candidates = slots.filter(start__gt=now, blocked=True)
+        changed += _flip(candidates.exclude(Exists(_busy_overlap(doctor_id))), False)
+    return changed
+
+
+def block_new_slots(doctor_id, since, now):
+    """Block free slots created since the last sync that overlap a stored busy interval."""
+    candidates = TimeSlot.objects.filter(
+        doctor_id=doctor_id, created_at__gte=since, start__gt=now, is_booked=False, blocked=False,
+    ).filter(Exists(_busy_overlap(doctor_id)))
+    return _flip(candidates, True)
+
+
+def apply_changes(doctor_id, busy, removed, now):
+    """Store busy intervals {event_id: (start, end)}, drop `removed` ids, and update slots.
+
+    Returns (blocked, released) slot counts. Must run in a transaction.
+    """
+    affected = set(busy) | set(removed)
+    previous = {}
+    if affected:
+        previous = {
+            event_id: (start, end)
+            for event_id, start, end in BusyInterval.objects.filter(user_id=doctor_id, event_id__in=affected)
+            .values_list('event_id', 'start', 'end')
+        }
+    changed = {event_id: r for event_id, r in busy.items() if previous.get(event_id) != r}
+    gone = [event_id for event_id in removed if event_id in previous]
+    if gone:
+        BusyInterval.objects.filter(user_id=doctor_id, event_id__in=gone).delete()
+    if changed:
+        BusyInterval.objects.bulk_create(
+            [BusyInterval(user_id=doctor_id, event_id=event_id, start=s, end=e) for event_id, (s, e) in changed.items()],
+            update_conflicts=True,
+            unique_fields=['user', 'event_id'],
+            update_fields=['start', 'end'],
+        )
+    released = release_slots(doctor_id, [previous[event_id] for event_id in gone + list(changed) if event_id in previous], now)
+    blocked = block_slots(doctor_id, list(changed.values()), now)
+    _slots_changed(doctor_id, blocked + released, freed=[pk for pk, _ in released])
+    return len(blocked), len(released)
+
+
+def _slots_changed(doctor_id, rows, freed=None):
+    # Queryset updates skip the TimeSlot signals. Daily summaries do not
+    # count blocked slots, so only the cached free slots and the admission
+    # count go stale.
+    if rows:
+        invalidate_doctor(doctor_id)
+        publish_slots(doctor_id, freed or None)
+
+
+def calendar_service(user, http=None, api_root=None):
+    authed_http = AuthorizedHttp(get_credentials(user), http=http or build_http())
+    client_options = {'api_endpoint': api_root} if api_root else None
+    return build_from_document(calendar_discovery_document(), http=authed_http, client_options=client_options)
+
+
+def sync_doctor(doctor, http=None, api_root=None):
+    """Import changes from one doctor's calendar; return a stats dict.
+
+    Raises GoogleCalendarToken.DoesNotExist if the doctor has no token.
+    """
+    state, _ = CalendarSyncState.objects.get_or_create(user=doctor)
+    service = calendar_service(doctor, http=http, api_root=api_root)
+    now = timezone.now()
+    full = not state.sync_token
+    try:
+        events, sync_token = fetch_changes(service, state.sync_token, time_min=now)
+    except FullSyncRequired:
+        logger.info(f'Sync token for {doctor.username} expired; running a full calendar sync')
+        full = True
+        events, sync_token = fetch_changes(service, time_min=now)
+
+    busy, removed = {}, set()
+    for event in events:
+        span = busy_range(event, now)
+        if span is None:
+            removed.add(event['id'])
+        else:
+            busy[event['id']] = span
+    with transaction.atomic():
+        if full:
+            stored = set(BusyInterval.objects.filter(user=doctor).values_list('event_id', flat=True))
+            removed |= stored - set(busy)
+        blocked, released = apply_changes(doctor.pk, busy, removed, now)
+        if state.synced_at and not full:
+            new = block_new_slots(doctor.pk, state.synced_at, now)
+            _slots_changed(doctor.pk, new)
+            blocked += len(new)
+        BusyInterval.objects.filter(user=doctor, end__lte=now).delete()
+        state.sync_token = sync_token
+        state.synced_at = now
+        state.last_error = ''
+        update_fields = ['sync_token', 'synced_at', 'last_error']
+        if full:
+            state.full_synced_at = now
+            update_fields.append('full_synced_at')
+        state.save(update_fields=update_fields)
+    return {'full': full, 'events': len(events), 'blocked': blocked, 'released': released}
+
+
+def clear_doctor(doctor_id):
+    """Forget a doctor's imported busy times and release the slots they blocked."""
+    with transaction.atomic():
+        stored = set(BusyInterval.objects.filter(user_id=doctor_id).values_list('event_id', flat=True))
+        apply_changes(doctor_id, {}, stored, timezone.now())
+        CalendarSyncState.objects.filter(user_id=doctor_id).delete()
+
+
+def sync_all(doctors, http=None, api_root=None):
+    """Sync each doctor in turn; a failing doctor is logged and skipped. Returns totals."""
+    totals = {'doctors': 0, 'failed': 0, 'events': 0, 'blocked': 0, 'released': 0}
+    for doctor in doctors:
+        try:
+            result = sync_doctor(doctor, http=http, api_root=api_root)
+        except Exception as exc:
+            logger.warning(f'Calendar busy sync for {doctor.username} failed: {exc}')
+            CalendarSyncState.objects.filter(user=doctor).update(last_error=str(exc))
+            totals['failed'] += 1
+            continue
+        totals['doctors'] += 1
+        for key in ('events', 'blocked', 'released'):
+            totals[key] += result[key]
+    return totals
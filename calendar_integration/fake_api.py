@@ -0,0 +1,144 @@
+"""Local stand-in for the Google Calendar events.list API, used by bench_busy_sync.
+
+Each access token gets its own calendar. Every change (insert, update or
+delete) takes the next sequence number, and a sync token is simply the
+sequence number the client has seen, so incremental lists return exactly
+the events changed since then, deletions included as `cancelled`.
+`expire_sync_tokens()` makes older tokens fail with 410 like Google does
+when it wants a full sync. A full list honours `timeMin`.
+"""
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EVENTS_PATH = '/calendar/v3/calendars/primary/events'
+
+
+class FakeCalendar:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}  # event id -> (sequence, event)
+        self.sequence = 0
+        self.min_sync_token = 0
+
+    def _put(self, event):
+        self.sequence += 1
+        self.events[event['id']] = (self.sequence, event)
+
+    def add_event(self, event_id, start, end, transparency='opaque'):
+        with self.lock:
+            self._put({
+                'id': event_id,
+                'status': 'confirmed',
+                'transparency': transparency,
+                'start': {'dateTime': start.isoformat()},
+                'end': {'dateTime': end.isoformat()},
+            })
+
+    def delete_event(self, event_id):
+        with self.lock:
+            self._put({'id': event_id, 'status': 'cancelled'})
+
+    def expire_sync_tokens(self):
+        with self.lock:
+            self.min_sync_token = self.sequence + 1
+
+    def changes(self, since, upto, time_min=None):
+        """Events changed in (since, upto]; a full list (since=None) leaves out deletions and events ended by `time_min`."""
+        with self.lock:
+            return [
+                event for sequence, event in sorted(self.events.values(), key=lambda item: item[0])
+                if (since is None and event['status'] != 'cancelled' and sequence <= upto
+                    and (time_min is None or datetime.fromisoformat(event['end']['dateTime']) > time_min))
+                or (since is not None and since < sequence <= upto)
+            ]
+
+
+class FakeCalendarAPI:
+    """Threaded HTTP server answering events.list; `api_root` goes to build_from_document()."""
+
+    def __init__(self):
+        self.calendars = {}
+        self.requests = 0
+        self.items_served = 0
+        self._lock = threading.Lock()
+        self.server = None
+
+    def calendar(self, access_token):
+        with self._lock:
+            return self.calendars.setdefault(access_token, FakeCalendar())
+
+    @property
+    def api_root(self):
+        return f'http://127.0.0.1:{self.server.server_port}/calendar/v3/'
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests = self.items_served = 0
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != EVENTS_PATH:
+                    return self.reply(404, {'error': {'code': 404, 'message': 'Not Found'}})
+                token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+                status, body = api.list_events(api.calendar(token), parse_qs(url.query))
+                self.reply(status, body)
+
+            def reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def list_events(self, calendar, query):
+        """Return (status, body) for one events.list page."""
+        max_results = int(query.get('maxResults', ['250'])[0])
+        page_token = query.get('pageToken', [None])[0]
+        if page_token:
+            offset, since, upto = page_token.split(':')
+            offset, upto = int(offset), int(upto)
+            since = int(since) if since else None
+        else:
+            sync_token = query.get('syncToken', [None])[0]
+            since = int(sync_token) if sync_token else None
+            if since is not None and since < calendar.min_sync_token:
+                return 410, {'error': {
+                    'code': 410,
+                    'message': 'Sync token is no longer valid, a full sync is required.',
+                    'errors': [{'reason': 'fullSyncRequired'}],
+                }}
+            offset, upto = 0, calendar.sequence
+        time_min = query.get('timeMin', [None])[0]
+        items = calendar.changes(since, upto, datetime.fromisoformat(time_min) if time_min else None)
+        page = items[offset:offset + max_results]
+        with self._lock:
+            self.requests += 1
+            self.items_served += len(page)
+        body = {'kind': 'calendar#events', 'items': page}
+        if offset + max_results < len(items):
+            body['nextPageToken'] = f'{offset + max_results}:{"" if since is None else since}:{upto}'
+        else:
+            body['nextSyncToken'] = str(upto)
+        return 200, body
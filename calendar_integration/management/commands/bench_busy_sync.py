@@ -0,0 +1,103 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from availability.models import TimeSlot
+from calendar_integration.busy import busy_range, sync_doctor
+from calendar_integration.fake_api import FakeCalendarAPI
+from calendar_integration.models import GoogleCalendarToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the busy-time import against a local fake Calendar API: a full sync of a large calendar, '
+        'then incremental syncs after a few changes, checking the blocked slots after each run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000, help='Events in the fake calendar')
+        parser.add_argument('--slots', type=int, default=2000, help='Future 30-minute slots of the doctor')
+        parser.add_argument('--changes', type=int, default=10, help='Events moved or deleted before the incremental sync')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        from users.models import User
+        rng = random.Random(options['seed'])
+        api = FakeCalendarAPI().start()
+        self.failures = 0
+        try:
+            with transaction.atomic():
+                doctor = User.objects.create(username='bench-busy-doctor', role=User.DOCTOR)
+                GoogleCalendarToken.objects.create(
+                    user=doctor, access_token='bench-busy-token', refresh_token='refresh',
+                    token_uri='https://oauth2.googleapis.com/token', client_id='bench', client_secret='bench',
+                    scopes=['https://www.googleapis.com/auth/calendar'],
+                    expiry=timezone.now() + timedelta(days=1),
+                )
+                calendar = api.calendar('bench-busy-token')
+                origin = timezone.now().replace(second=0, microsecond=0) + timedelta(hours=1)
+                TimeSlot.objects.bulk_create([
+                    TimeSlot(doctor=doctor, start=origin + timedelta(minutes=30 * n), end=origin + timedelta(minutes=30 * n + 30))
+                    for n in range(options['slots'])
+                ])
+                # Events spread over twice the slot horizon, so many never touch a slot.
+                horizon = options['slots'] * 60
+                for n in range(options['events']):
+                    self.add_random(calendar, f'evt{n}', origin, horizon, rng)
+
+                self.run('full sync', doctor, api, calendar)
+                self.run('incremental, no changes', doctor, api, calendar)
+                ids = rng.sample(sorted(calendar.events), options['changes'])
+                for event_id in ids[::2]:
+                    calendar.delete_event(event_id)
+                for event_id in ids[1::2]:
+                    self.add_random(calendar, event_id, origin, horizon, rng)
+                self.run(f'incremental, {len(ids)} changes', doctor, api, calendar)
+                # Past the existing slots, so the new one overlaps only the event.
+                last_slot_end = origin + timedelta(minutes=30 * options['slots'])
+                start, end = next(
+                    span for span in (busy_range(event, timezone.now()) for _, event in calendar.events.values())
+                    if span and span[0] >= last_slot_end
+                )
+                TimeSlot.objects.create(doctor=doctor, start=start, end=start + timedelta(minutes=5))
+                self.run('incremental, new clashing slot', doctor, api, calendar)
+                calendar.expire_sync_tokens()
+                calendar.delete_event(ids[1])
+                self.run('expired token (410)', doctor, api, calendar)
+                transaction.set_rollback(True)
+        finally:
+            api.stop()
+        if self.failures:
+            raise CommandError(f'{self.failures} run(s) left slots blocked incorrectly')
+
+    def add_random(self, calendar, event_id, origin, horizon, rng):
+        start = origin + timedelta(minutes=rng.randrange(horizon))
+        transparency = 'transparent' if rng.random() < 0.1 else 'opaque'
+        calendar.add_event(event_id, start, start + timedelta(minutes=rng.choice((15, 30, 60, 90))), transparency)
+
+    def run(self, label, doctor, api, calendar):
+        api.reset_counts()
+        started = time.perf_counter()
+        result = sync_doctor(doctor, api_root=api.api_root)
+        elapsed = time.perf_counter() - started
+        ok = self.blocked(doctor) == self.expected(doctor, calendar)
+        self.failures += not ok
+        line = (
+            f'{label:<32} {elapsed * 1000:8.1f} ms  requests={api.requests} events={api.items_served} '
+            f"blocked={result['blocked']} released={result['released']}  {'OK' if ok else 'MISMATCH'}"
+        )
+        self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+
+    def blocked(self, doctor):
+        return set(TimeSlot.objects.filter(doctor=doctor, blocked=True).values_list('pk', flat=True))
+
+    def expected(self, doctor, calendar):
+        now = timezone.now()
+        ranges = [busy_range(event, now) for _, event in calendar.events.values()]
+        ranges = [r for r in ranges if r]
+        return {
+            pk for pk, start, end in TimeSlot.objects.filter(doctor=doctor, start__gt=now).values_list('pk', 'start', 'end')
+            if any(s < end and e > start for s, e in ranges)
+        }
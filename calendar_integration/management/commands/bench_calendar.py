@@ -0,0 +1,125 @@
+import json
+import re
+import time
+from datetime import timedelta
+from email.parser import BytesParser
+from types import SimpleNamespace
+import httplib2
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from calendar_integration.models import GoogleCalendarToken
+from calendar_integration import utils
+
+
+class MockTransport:
+    """httplib2-compatible transport that answers Calendar inserts without a network.
+
+    Every call counts as one round-trip and sleeps `latency` seconds;
+    batch requests are answered part by part.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.round_trips = 0
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if '/batch/' not in uri:
+            return httplib2.Response({'status': 200, 'content-type': 'application/json'}), self._event(body)
+
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        message = BytesParser().parsebytes(f"Content-Type: {headers['content-type']}\r\n\r\n".encode() + body)
+        boundary = 'mock_batch_boundary'
+        parts = []
+        for part in message.get_payload():
+            # Each part is a serialized HTTP request: headers, blank line, JSON body.
+            request_body = re.split(r'\r?\n\r?\n', part.get_payload(), maxsplit=1)[-1]
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {part["Content-ID"]}\r\n\r\n'
+                f'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{self._event(request_body).decode()}\r\n'
+            )
+        content = ''.join(parts) + f'--{boundary}--'
+        response = httplib2.Response({'status': 200, 'content-type': f'multipart/mixed; boundary={boundary}'})
+        return response, content.encode('utf-8')
+
+    def _event(self, body):
+        event = json.loads(body) if body else {}
+        event.setdefault('htmlLink', 'https://calendar.example/event')
+        return json.dumps(event).encode('utf-8')
+
+
+def legacy_create_appointment_events(booking, transport):
+    """The previous per-call path: reload tokens, build() the service, insert one at a time."""
+    for user in (booking.slot.doctor, booking.patient):
+        token = GoogleCalendarToken.objects.get(user=user)
+        creds = Credentials(
+            token=token.access_token,
+            refresh_token=token.refresh_token,
+            token_uri=token.token_uri,
+            client_id=token.client_id,
+            client_secret=token.client_secret,
+            scopes=token.scopes,
+        )
+        service = build('calendar', 'v3', http=AuthorizedHttp(creds, http=transport), static_discovery=True)
+        body = utils._event_body('Appointment', booking.slot.start, booking.slot.end)
+        service.events().insert(calendarId='primary', body=body).execute()
+
+
+def batched_create_appointment_events(booking, transport):
+    """The cached path: shared discovery document and credentials, both inserts in one batch request."""
+    batch = None
+    for user, body in utils.appointment_event_bodies(booking):
+        service = utils.get_calendar_service(user, http=transport)
+        if batch is None:
+            batch = service.new_batch_http_request()
+        batch.add(service.events().insert(calendarId='primary', body=body))
+    batch.execute()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark calendar event creation (cold build per call vs. cached discovery/credentials + batch) over a mocked transport.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.0, help='Simulated seconds per HTTP round-trip')
+
+    def handle(self, *args, **options):
+        from users.models import User
+        with transaction.atomic():
+            doctor = User.objects.create(username='bench-calendar-doctor', role=User.DOCTOR)
+            patient = User.objects.create(username='bench-calendar-patient', role=User.PATIENT)
+            for user in (doctor, patient):
+                GoogleCalendarToken.objects.create(
+                    user=user, access_token=f'token-{user.pk}', refresh_token='refresh',
+                    token_uri='https://oauth2.googleapis.com/token', client_id='bench', client_secret='bench',
+                    scopes=['https://www.googleapis.com/auth/calendar'],
+                    expiry=timezone.now() + timedelta(days=1),
+                )
+            start = timezone.now()
+            booking = SimpleNamespace(
+                slot=SimpleNamespace(doctor=doctor, start=start, end=start + timedelta(minutes=30)),
+                patient=patient,
+            )
+
+            for label, run in (
+                ('legacy: build() per call', lambda t: legacy_create_appointment_events(booking, t)),
+                ('cached + batched', lambda t: batched_create_appointment_events(booking, t)),
+            ):
+                transport = MockTransport(options['latency'])
+                n = options['bookings']
+                started = time.perf_counter()
+                for _ in range(n):
+                    run(transport)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label:<28} {n} bookings  {elapsed:7.3f}s  {elapsed / n * 1000:7.2f} ms/booking  '
+                    f'{transport.round_trips / n:.1f} round-trips/booking'
+                )
+            transaction.set_rollback(True)
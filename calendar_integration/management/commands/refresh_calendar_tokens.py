@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from calendar_integration.utils import refresh_expiring_tokens, REFRESH_MARGIN
+
+
+class Command(BaseCommand):
+    help = 'Renew Google Calendar access tokens before they expire, so requests do not refresh them inline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--margin', type=int, default=int(REFRESH_MARGIN.total_seconds()),
+            help='Refresh tokens expiring within this many seconds',
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Tokens refreshed per round')
+        parser.add_argument('--poll-interval', type=float, default=60.0, help='Seconds between rounds')
+        parser.add_argument('--once', action='store_true', help='Refresh what is due now and exit')
+
+    def handle(self, *args, **options):
+        margin = timedelta(seconds=options['margin'])
+        if options['poll_interval'] >= options['margin']:
+            self.stderr.write(self.style.WARNING('--poll-interval is not shorter than --margin; tokens may expire between rounds'))
+        while True:
+            refreshed, failed = refresh_expiring_tokens(margin, options['limit'])
+            if refreshed or failed:
+                self.stdout.write(f'refreshed={refreshed} failed={failed}')
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Calendar tokens refreshed'))
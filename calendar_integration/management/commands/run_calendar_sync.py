@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from calendar_integration.sync import run_once, queue_stats, RateLimiter, CLAIM_SIZE, USER_RATE_PER_SECOND, USER_BURST
+
+
+class Command(BaseCommand):
+    help = 'Process queued Google Calendar writes with per-user rate limiting, coalescing and retries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Users processed concurrently')
+        parser.add_argument('--claim-size', type=int, default=CLAIM_SIZE, help='Jobs claimed per round')
+        parser.add_argument('--rate', type=float, default=USER_RATE_PER_SECOND, help='Events per second per user')
+        parser.add_argument('--burst', type=int, default=USER_BURST, help='Token bucket capacity per user')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--once', action='store_true', help='Process what is due now and exit')
+        parser.add_argument('--stats', action='store_true', help='Print queue depth and lag and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+        limiter = RateLimiter(options['rate'], options['burst'])
+        total = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                processed = run_once(executor, limiter, options['claim_size'])
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} calendar jobs'))
+        self.print_stats()
+
+    def print_stats(self):
+        stats = queue_stats()
+        self.stdout.write(
+            f"depth={stats['depth']} due={stats['due']} dead={stats['dead']} lag={stats['lag_seconds']:.1f}s"
+        )
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from calendar_integration.busy import sync_all
+
+
+class Command(BaseCommand):
+    help = "Import changes from doctors' Google Calendars and block slots that clash with busy events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', action='append', help='Only sync this username (repeatable)')
+        parser.add_argument('--api-root', help='Calendar API base URL, e.g. a local fake (http://127.0.0.1:8765/calendar/v3/)')
+        parser.add_argument('--poll-interval', type=float, default=60.0, help='Seconds between rounds')
+        parser.add_argument('--once', action='store_true', help='Sync every doctor once and exit')
+
+    def handle(self, *args, **options):
+        from users.models import User
+        doctors = User.objects.filter(role=User.DOCTOR, calendar_token__isnull=False).order_by('pk')
+        if options['doctor']:
+            doctors = doctors.filter(username__in=options['doctor'])
+            if not doctors.exists():
+                raise CommandError('No matching doctors with a connected calendar')
+        while True:
+            totals = sync_all(doctors, api_root=options['api_root'])
+            self.stdout.write(
+                f"doctors={totals['doctors']} failed={totals['failed']} events={totals['events']} "
+                f"blocked={totals['blocked']} released={totals['released']}"
+            )
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_integration', '0002_calendarsyncjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='googlecalendartoken',
+            name='expiry',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_integration', '0003_alter_googlecalendartoken_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sync_token', models.TextField(blank=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('full_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_sync_state', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BusyInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='busy_intervals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'end'], name='busyinterval_user_end_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'event_id'), name='busyinterval_user_event_uniq')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class GoogleCalendarToken(models.Model):
@@ -11,9 +12,96 @@ class GoogleCalendarToken(models.Model):
     client_id = models.CharField(max_length=255)
     client_secret = models.CharField(max_length=255)
     scopes = models.JSONField()
-    expiry = models.DateTimeField(null=True, blank=True)
+    # Indexed for refresh_calendar_tokens, which renews tokens near expiry.
+    expiry = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Calendar token for {self.user.username}"
+
+
+class CalendarSyncJob(models.Model):
+    """One calendar event to insert for a user, processed by `run_calendar_sync`."""
+    PENDING = 'pending'
+    DONE = 'done'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (DEAD, 'Dead letter'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='calendar_jobs')
+    booking = models.ForeignKey('bookings.Booking', on_delete=models.CASCADE, related_name='calendar_jobs')
+    event = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    event_id = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='calendarjob_pending_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Calendar job for {self.user.username} ({self.status})"
+
+    @classmethod
+    def enqueue_for_booking(cls, booking):
+        """Queue doctor and patient events for users that connected a calendar."""
+        from .utils import appointment_event_bodies
+        connected = set(
+            GoogleCalendarToken.objects
+            .filter(user_id__in=[booking.slot.doctor_id, booking.patient_id])
+            .values_list('user_id', flat=True)
+        )
+        return cls.objects.bulk_create([
+            cls(user=user, booking=booking, event=event)
+            for user, event in appointment_event_bodies(booking) if user.pk in connected
+        ])
+
+
+class CalendarSyncState(models.Model):
+    """Where a doctor's busy-time import left off (see busy.py)."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='calendar_sync_state')
+    # Google's nextSyncToken; empty until the first full sync completes.
+    sync_token = models.TextField(blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    full_synced_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Calendar sync state for {self.user.username}"
+
+
+class BusyInterval(models.Model):
+    """A busy (opaque, not cancelled) future event in a doctor's Google Calendar.
+
+    Only the event id and its time range are kept.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='busy_intervals')
+    event_id = models.CharField(max_length=255)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'event_id'], name='busyinterval_user_event_uniq'),
+        ]
+        indexes = [
+            # Overlap checks (end > slot start) and pruning of past events.
+            models.Index(fields=['user', 'end'], name='busyinterval_user_end_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} busy {self.start.isoformat()} - {self.end.isoformat()}"
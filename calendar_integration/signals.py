@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import GoogleCalendarToken
+from .utils import invalidate_credentials
+
+
+@receiver(post_save, sender=GoogleCalendarToken)
+@receiver(post_delete, sender=GoogleCalendarToken)
+def drop_cached_credentials(sender, instance, **kwargs):
+    invalidate_credentials(instance.user_id)
+
+
+@receiver(post_delete, sender=GoogleCalendarToken)
+def release_calendar_blocks(sender, instance, **kwargs):
+    # A disconnected calendar no longer blocks the doctor's slots.
+    from .busy import clear_doctor
+    user_id = instance.user_id
+    transaction.on_commit(lambda: clear_doctor(user_id))
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from hms.utils import backoff_delay
+from .models import CalendarSyncJob, GoogleCalendarToken
+from .utils import insert_events
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SIZE = 200
+# Google accepts up to 1000 parts per batch; keep requests small.
+MAX_EVENTS_PER_BATCH = 50
+MAX_ATTEMPTS = 6
+LEASE_SECONDS = 120
+USER_RATE_PER_SECOND = 2.0
+USER_BURST = 10
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate=USER_RATE_PER_SECOND, capacity=USER_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, wanted):
+        """Take up to `wanted` tokens; return how many were granted."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            granted = min(wanted, int(self.tokens))
+            self.tokens -= granted
+            return granted
+
+    def wait_time(self):
+        """Seconds until at least one token is available."""
+        with self.lock:
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Per-user token buckets for one worker process."""
+
+    def __init__(self, rate=USER_RATE_PER_SECOND, burst=USER_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, user_id):
+        with self._lock:
+            if user_id not in self._buckets:
+                self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            return self._buckets[user_id]
+
+
+def claim_jobs(limit=CLAIM_SIZE):
+    """Lease due jobs and return them grouped by user id."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            CalendarSyncJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=CalendarSyncJob.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:limit]
+        )
+        if jobs:
+            CalendarSyncJob.objects.filter(pk__in=[j.pk for j in jobs]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+            )
+    by_user = defaultdict(list)
+    for job in jobs:
+        by_user[job.user_id].append(job)
+    return by_user
+
+
+def _record_failure(job, error):
+    job.attempts += 1
+    job.last_error = error
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = CalendarSyncJob.DEAD
+        logger.error(f'Calendar job {job.pk} dead-lettered after {job.attempts} attempts: {error}')
+    else:
+        job.next_attempt_at = timezone.now() + backoff_delay(job.attempts)
+    job.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def process_user_jobs(user, jobs, limiter, http=None):
+    """Send one user's coalesced jobs as batch requests, within the user's rate limit."""
+    bucket = limiter.bucket(user.pk)
+    granted = bucket.take(len(jobs))
+    deferred = jobs[granted:]
+    if deferred:
+        # Over the limit: push back without spending an attempt.
+        CalendarSyncJob.objects.filter(pk__in=[j.pk for j in deferred]).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=bucket.wait_time() + len(deferred) / limiter.rate),
+        )
+    jobs = jobs[:granted]
+    for start in range(0, len(jobs), MAX_EVENTS_PER_BATCH):
+        chunk = jobs[start:start + MAX_EVENTS_PER_BATCH]
+        try:
+            results = insert_events(user, [job.event for job in chunk], http=http)
+        except GoogleCalendarToken.DoesNotExist:
+            CalendarSyncJob.objects.filter(pk__in=[j.pk for j in chunk]).update(
+                status=CalendarSyncJob.DEAD, last_error='No calendar token',
+            )
+            continue
+        except Exception as exc:
+            logger.warning(f'Calendar batch for {user.username} failed: {exc}')
+            results = [(None, str(exc))] * len(chunk)
+        for job, (event, error) in zip(chunk, results):
+            if error is None:
+                job.status = CalendarSyncJob.DONE
+                job.event_id = event.get('id', '')
+                job.completed_at = timezone.now()
+                job.save(update_fields=['status', 'event_id', 'completed_at'])
+            else:
+                _record_failure(job, error)
+    return len(jobs)
+
+
+def run_once(executor, limiter, claim_size=CLAIM_SIZE, http=None):
+    """Claim one round of jobs and process each user's group on the executor."""
+    from users.models import User
+    by_user = claim_jobs(claim_size)
+    if not by_user:
+        return 0
+    users = User.objects.in_bulk(list(by_user))
+    futures = [
+        executor.submit(process_user_jobs, users[user_id], jobs, limiter, http)
+        for user_id, jobs in by_user.items()
+    ]
+    return sum(f.result() for f in futures)
+
+
+def queue_stats():
+    """Return queue depth, dead letters and lag (age of the oldest pending job, seconds)."""
+    pending = CalendarSyncJob.objects.filter(status=CalendarSyncJob.PENDING)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'depth': pending.count(),
+        'due': pending.filter(next_attempt_at__lte=timezone.now()).count(),
+        'dead': CalendarSyncJob.objects.filter(status=CalendarSyncJob.DEAD).count(),
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
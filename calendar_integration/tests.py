@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from availability.models import TimeSlot
+from availability.summary import refresh_days, slot_day
+from bookings import admission
+from users.models import User
+from .busy import sync_doctor
+from .fake_api import FakeCalendarAPI
+from .models import BusyInterval, CalendarSyncState, GoogleCalendarToken
+from .utils import Credentials, _credentials_from_token, get_credentials
+
+
+class BusySyncTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.api = FakeCalendarAPI().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.api.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        token = f'token-{self.id()}'
+        GoogleCalendarToken.objects.create(
+            user=self.doctor, access_token=token, refresh_token='refresh',
+            token_uri='https://oauth2.googleapis.com/token', client_id='test', client_secret='test',
+            scopes=['https://www.googleapis.com/auth/calendar'], expiry=timezone.now() + timedelta(days=1),
+        )
+        self.calendar = self.api.calendar(token)
+        self.origin = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.slots = [
+            TimeSlot.objects.create(doctor=self.doctor, start=self.at(30 * n), end=self.at(30 * n + 30))
+            for n in range(4)
+        ]
+        self.api.reset_counts()
+
+    def at(self, minutes):
+        return self.origin + timedelta(minutes=minutes)
+
+    def sync(self):
+        return sync_doctor(self.doctor, api_root=self.api.api_root)
+
+    def blocked(self):
+        return set(TimeSlot.objects.filter(doctor=self.doctor, blocked=True).values_list('pk', flat=True))
+
+    def test_full_sync_blocks_overlapping_slots(self):
+        self.calendar.add_event('a', self.at(10), self.at(40))
+        self.calendar.add_event('free', self.at(90), self.at(120), transparency='transparent')
+        self.calendar.add_event('past', self.origin - timedelta(days=3), self.origin - timedelta(days=2))
+
+        result = self.sync()
+
+        self.assertTrue(result['full'])
+        # timeMin leaves the finished event out of the listing.
+        self.assertEqual(result['events'], 2)
+        self.assertEqual(self.blocked(), {self.slots[0].pk, self.slots[1].pk})
+        self.assertFalse(TimeSlot.objects.filter(is_booked=True).exists())
+        self.assertEqual(list(TimeSlot.available_for_doctor(self.doctor)), self.slots[2:])
+        self.assertTrue(CalendarSyncState.objects.get(user=self.doctor).sync_token)
+
+    def test_blocked_slots_are_not_counted_as_booked(self):
+        self.calendar.add_event('a', self.at(0), self.at(60))
+        self.sync()
+        refresh_days(self.doctor.pk, [slot_day(self.origin)])
+        summary = self.doctor.daily_summaries.get()
+        self.assertEqual(summary.slots_booked, 0)
+
+    def test_incremental_sync_lists_only_changes(self):
+        self.calendar.add_event('a', self.at(0), self.at(30))
+        for n in range(5):
+            self.calendar.add_event(f'later{n}', self.at(600 + n * 60), self.at(630 + n * 60))
+        self.sync()
+
+        self.calendar.add_event('b', self.at(60), self.at(90))
+        result = self.sync()
+
+        self.assertFalse(result['full'])
+        self.assertEqual(result['events'], 1)
+        self.assertEqual(result['blocked'], 1)
+        self.assertEqual(self.blocked(), {self.slots[0].pk, self.slots[2].pk})
+
+    def test_deleted_event_unblocks_slots(self):
+        self.calendar.add_event('a', self.at(0), self.at(60))
+        self.calendar.add_event('b', self.at(30), self.at(45))
+        self.sync()
+
+        self.calendar.delete_event('a')
+        result = self.sync()
+
+        self.assertFalse(result['full'])
+        self.assertEqual(result['released'], 1)
+        self.assertEqual(self.blocked(), {self.slots[1].pk})
+        self.assertFalse(BusyInterval.objects.filter(user=self.doctor, event_id='a').exists())
+
+    def test_expired_sync_token_forces_full_sync(self):
+        self.calendar.add_event('a', self.at(0), self.at(30))
+        self.calendar.add_event('b', self.at(60), self.at(90))
+        self.sync()
+
+        self.calendar.expire_sync_tokens()
+        self.calendar.delete_event('a')
+        result = self.sync()
+
+        self.assertTrue(result['full'])
+        self.assertEqual(result['events'], 1)
+        self.assertEqual(result['released'], 1)
+        self.assertEqual(self.blocked(), {self.slots[2].pk})
+        state = CalendarSyncState.objects.get(user=self.doctor)
+        self.assertEqual(state.full_synced_at, state.synced_at)
+
+    @override_settings(BOOKING_ADMISSION=True)
+    def test_blocking_and_releasing_recount_free_slots(self):
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 4)
+        self.calendar.add_event('a', self.at(0), self.at(60))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sync()
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 2)
+
+        self.calendar.delete_event('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sync()
+        self.assertEqual(admission.free_slot_count(self.doctor.pk), 4)
+
+
+class CredentialsRefreshTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='doc', role=User.DOCTOR)
+        self.token = GoogleCalendarToken.objects.create(
+            user=self.user, access_token='old', refresh_token='refresh',
+            token_uri='https://oauth2.googleapis.com/token', client_id='test', client_secret='test',
+            scopes=['https://www.googleapis.com/auth/calendar'], expiry=timezone.now() + timedelta(hours=1),
+        )
+        self.refreshes = 0
+
+    def fake_refresh(self, creds, request):
+        self.refreshes += 1
+        creds.token = f'new-{self.refreshes}'
+        creds.expiry = datetime.now(dt_timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    def test_inline_refresh_is_shared_and_saved(self):
+        # Two separate holders of the same token, e.g. AuthorizedHttp
+        # instances that both got a 401 for it.
+        first, second = get_credentials(self.user), _credentials_from_token(self.token)
+        with mock.patch.object(Credentials, 'refresh', self.fake_refresh):
+            first.refresh(None)
+            second.refresh(None)
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual((first.token, second.token), ('new-1', 'new-1'))
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.access_token, 'new-1')
+
+    def test_rejected_current_token_is_refreshed_again(self):
+        creds = get_credentials(self.user)
+        with mock.patch.object(Credentials, 'refresh', self.fake_refresh):
+            creds.refresh(None)
+            creds.refresh(None)
+        self.assertEqual(self.refreshes, 2)
+        self.assertEqual(creds.token, 'new-2')
@@ -1,38 +1,196 @@
 import os
+import json
 import logging
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from hms import metrics
 from .models import GoogleCalendarToken
 
 logger = logging.getLogger(__name__)
 
+CREDENTIALS_CACHE_SIZE = 256
+# Tokens expiring within this window are renewed by refresh_calendar_tokens.
+REFRESH_MARGIN = timedelta(seconds=int(os.getenv('CALENDAR_REFRESH_MARGIN_SECONDS', '600')))
 
-def get_calendar_service(user):
-    """Get Google Calendar service for a user."""
+CALENDAR_REQUEST_SECONDS = metrics.histogram(
+    'hms_calendar_request_seconds', 'Latency of Google Calendar API requests', ['operation', 'outcome'],
+)
+CALENDAR_TOKEN_REFRESHES = metrics.counter(
+    'hms_calendar_token_refreshes_total', 'OAuth token refreshes by caller', ['source', 'outcome'],
+)
+
+# user_id -> Credentials, most recently used last. Entries are dropped by
+# the GoogleCalendarToken save/delete signals (see signals.py).
+_credentials_cache = OrderedDict()
+_credentials_lock = threading.Lock()
+# Locks serializing token refreshes in this process; a user always maps to
+# the same one, and a fixed pool keeps memory flat however many users refresh.
+REFRESH_LOCK_STRIPES = 64
+_refresh_locks = [threading.Lock() for _ in range(REFRESH_LOCK_STRIPES)]
+
+
+@lru_cache(maxsize=None)
+def calendar_discovery_document():
+    """Calendar v3 discovery document, loaded and parsed once per process."""
+    return json.loads(get_static_doc('calendar', 'v3'))
+
+
+def invalidate_credentials(user_id):
+    with _credentials_lock:
+        _credentials_cache.pop(user_id, None)
+
+
+def _remember_credentials(user_id, creds):
+    with _credentials_lock:
+        _credentials_cache[user_id] = creds
+        _credentials_cache.move_to_end(user_id)
+        while len(_credentials_cache) > CREDENTIALS_CACHE_SIZE:
+            _credentials_cache.popitem(last=False)
+
+
+class _UserCredentials(Credentials):
+    """Credentials whose inline refreshes (e.g. by AuthorizedHttp) go through refresh_credentials()."""
+
+    def __init__(self, *args, user_id, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_id = user_id
+
+    def refresh(self, request):
+        fresh = refresh_credentials(self.user_id, stale_token=self.token)
+        self.token = fresh.token
+        self.expiry = fresh.expiry
+
+
+def _credentials_from_token(token):
+    return _UserCredentials(
+        user_id=token.user_id,
+        token=token.access_token,
+        refresh_token=token.refresh_token,
+        token_uri=token.token_uri,
+        client_id=token.client_id,
+        client_secret=token.client_secret,
+        scopes=token.scopes,
+        # google-auth compares expiry against naive UTC datetimes
+        expiry=timezone.make_naive(token.expiry, dt_timezone.utc) if token.expiry else None,
+    )
+
+
+def _expires_within(creds, margin):
+    return creds.expiry is not None and creds.expiry - margin <= timezone.make_naive(timezone.now(), dt_timezone.utc)
+
+
+def _refresh_lock(user_id):
+    return _refresh_locks[user_id % REFRESH_LOCK_STRIPES]
+
+
+def _usable(creds, margin, stale_token):
+    return not creds.expired and not _expires_within(creds, margin) and creds.token != stale_token
+
+
+def refresh_credentials(user_id, margin=timedelta(0), source='inline', stale_token=None):
+    """Refresh a user's access token unless someone else already has.
+
+    Only one refresh per user runs at a time: threads of this process
+    queue on a striped lock, other processes on the token row (SELECT
+    ... FOR UPDATE). Whoever gets in second re-reads the row and reuses
+    the new token if it no longer expires within `margin` and is not
+    `stale_token` (one the API has just rejected).
+    """
+    with _refresh_lock(user_id):
+        with _credentials_lock:
+            creds = _credentials_cache.get(user_id)
+        if creds is not None and _usable(creds, margin, stale_token):
+            return creds
+        with transaction.atomic():
+            token = GoogleCalendarToken.objects.select_for_update().get(user_id=user_id)
+            creds = _credentials_from_token(token)
+            if creds.refresh_token and not _usable(creds, margin, stale_token):
+                outcome = 'error'
+                try:
+                    Credentials.refresh(creds, Request())
+                    outcome = 'refreshed'
+                finally:
+                    CALENDAR_TOKEN_REFRESHES.inc(source=source, outcome=outcome)
+                # A queryset update skips post_save, so the refreshed
+                # credentials stay cached.
+                GoogleCalendarToken.objects.filter(pk=token.pk).update(
+                    access_token=creds.token,
+                    expiry=timezone.make_aware(creds.expiry, dt_timezone.utc) if creds.expiry else None,
+                    updated_at=timezone.now(),
+                )
+        _remember_credentials(user_id, creds)
+        return creds
+
+
+def get_credentials(user):
+    """Return cached Credentials for a user, loading the token row on a miss.
+
+    Expired credentials are refreshed through refresh_credentials(), here
+    or when AuthorizedHttp refreshes them, so concurrent callers share one
+    refresh and its result is saved to the token row.
+    """
+    with _credentials_lock:
+        creds = _credentials_cache.get(user.pk)
+        if creds is not None:
+            _credentials_cache.move_to_end(user.pk)
+    if creds is None:
+        creds = _credentials_from_token(GoogleCalendarToken.objects.get(user=user))
+        _remember_credentials(user.pk, creds)
+    if creds.expired and creds.refresh_token:
+        creds = refresh_credentials(user.pk)
+    return creds
+
+
+def refresh_expiring_tokens(margin=REFRESH_MARGIN, limit=None):
+    """Refresh every token expiring within `margin`, soonest first.
+
+    Returns (refreshed, failed). Run periodically by
+    `refresh_calendar_tokens` so requests rarely refresh inline.
+    """
+    due = (
+        GoogleCalendarToken.objects
+        .filter(expiry__lte=timezone.now() + margin)
+        .exclude(refresh_token='')
+        .order_by('expiry')
+        .values_list('user_id', flat=True)
+    )
+    if limit:
+        due = due[:limit]
+    refreshed = failed = 0
+    for user_id in due:
+        try:
+            refresh_credentials(user_id, margin=margin, source='background')
+            refreshed += 1
+        except GoogleCalendarToken.DoesNotExist:
+            continue  # disconnected meanwhile
+        except Exception as exc:
+            failed += 1
+            logger.warning(f'Could not refresh calendar token for user {user_id}: {exc}')
+    return refreshed, failed
+
+
+def get_calendar_service(user, http=None):
+    """Get Google Calendar service for a user.
+
+    `http` is the underlying transport (an httplib2.Http or compatible
+    mock); it is wrapped so every request carries the user's credentials.
+    """
     try:
-        token = GoogleCalendarToken.objects.get(user=user)
-        creds = Credentials(
-            token=token.access_token,
-            refresh_token=token.refresh_token,
-            token_uri=token.token_uri,
-            client_id=token.client_id,
-            client_secret=token.client_secret,
-            scopes=token.scopes
-        )
-        
-        # Refresh token if expired
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            # Update stored token
-            token.access_token = creds.token
-            if creds.expiry:
-                token.expiry = creds.expiry
-            token.save()
-        
-        return build('calendar', 'v3', credentials=creds)
+        creds = get_credentials(user)
+        authed_http = AuthorizedHttp(creds, http=http or build_http())
+        return build_from_document(calendar_discovery_document(), http=authed_http)
     except GoogleCalendarToken.DoesNotExist:
         logger.warning(f'No calendar token found for user {user.username}')
         return None
@@ -41,14 +199,8 @@ def get_calendar_service(user):
         return None
 
 
-def create_calendar_event(user, summary, start_time, end_time, description=''):
-    """Create a calendar event for a user."""
-    service = get_calendar_service(user)
-    if not service:
-        logger.warning(f'Cannot create calendar event for {user.username} - no token')
-        return None
-    
-    event = {
+def _event_body(summary, start_time, end_time, description=''):
+    return {
         'summary': summary,
         'description': description,
         'start': {
@@ -60,29 +212,70 @@ def create_calendar_event(user, summary, start_time, end_time, description=''):
             'timeZone': 'UTC',
         },
     }
-    
+
+
+def create_calendar_event(user, summary, start_time, end_time, description=''):
+    """Create a calendar event for a user."""
+    service = get_calendar_service(user)
+    if not service:
+        logger.warning(f'Cannot create calendar event for {user.username} - no token')
+        return None
+
+    event = _event_body(summary, start_time, end_time, description)
+
+    started = time.perf_counter()
+    outcome = 'error'
     try:
         event = service.events().insert(calendarId='primary', body=event).execute()
+        outcome = 'ok'
         logger.info(f'Calendar event created for {user.username}: {event.get("htmlLink")}')
         return event
     except HttpError as error:
         logger.error(f'Failed to create calendar event: {error}')
         return None
+    finally:
+        CALENDAR_REQUEST_SECONDS.observe(time.perf_counter() - started, operation='insert', outcome=outcome)
 
 
-def create_appointment_events(booking):
-    """Create calendar events for both doctor and patient after booking."""
+def appointment_event_bodies(booking):
+    """Return [(user, event body)] for the doctor and patient of a booking."""
     doctor = booking.slot.doctor
     patient = booking.patient
     start_time = booking.slot.start
     end_time = booking.slot.end
-    
-    # Create event for doctor
-    doctor_summary = f'Appointment with {patient.get_full_name()}'
-    doctor_desc = f'Patient: {patient.get_full_name()} ({patient.email})'
-    create_calendar_event(doctor, doctor_summary, start_time, end_time, doctor_desc)
-    
-    # Create event for patient
-    patient_summary = f'Appointment with Dr. {doctor.get_full_name()}'
-    patient_desc = f'Doctor: {doctor.get_full_name()} ({doctor.email})'
-    create_calendar_event(patient, patient_summary, start_time, end_time, patient_desc)
+    return [
+        (doctor, _event_body(
+            f'Appointment with {patient.get_full_name()}', start_time, end_time,
+            f'Patient: {patient.get_full_name()} ({patient.email})',
+        )),
+        (patient, _event_body(
+            f'Appointment with Dr. {doctor.get_full_name()}', start_time, end_time,
+            f'Doctor: {doctor.get_full_name()} ({doctor.email})',
+        )),
+    ]
+
+
+def insert_events(user, bodies, http=None):
+    """Insert several events into one user's primary calendar with a single batch request.
+
+    Returns a list aligned with `bodies` of (event, error) pairs. Raises
+    GoogleCalendarToken.DoesNotExist if the user has no token.
+    """
+    creds = get_credentials(user)
+    service = build_from_document(calendar_discovery_document(), http=AuthorizedHttp(creds, http=http or build_http()))
+    results = [(None, 'not sent')] * len(bodies)
+
+    def on_result(request_id, response, exception):
+        results[int(request_id)] = (None, str(exception)) if exception is not None else (response, None)
+
+    batch = service.new_batch_http_request(callback=on_result)
+    for index, body in enumerate(bodies):
+        batch.add(service.events().insert(calendarId='primary', body=body), request_id=str(index))
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        batch.execute()
+        outcome = 'ok' if all(error is None for _, error in results) else 'partial'
+    finally:
+        CALENDAR_REQUEST_SECONDS.observe(time.perf_counter() - started, operation='batch_insert', outcome=outcome)
+    return results
@@ -0,0 +1,16 @@
+# Picked up by `gunicorn hms.wsgi` started from the project root.
+import os
+
+
+def on_starting(server):
+    # Files left by a previous master's workers would be summed with the new ones.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms.settings')
+    from hms.metrics import clear_directory
+    clear_directory()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's METRICS_DIR file so /metrics sums live workers only.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms.settings')
+    from hms.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,124 @@
+"""Primary/replica routing: reads go to a replica only inside use_replica(), and writes pin reads to the primary."""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_PREFIX = 'replica_'
+STICKY_COOKIE = 'hms_primary_until'
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+# Where reads may go in the current context, and whether it has written.
+_reads = ContextVar('hms_db_reads', default=PRIMARY)
+_pinned = ContextVar('hms_db_pinned', default=False)
+_wrote = ContextVar('hms_db_wrote', default=None)
+
+# Always read from the primary: a lagging session row would log users out.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+@contextmanager
+def use_replica():
+    """Allow reads in this block (or decorated view) to be served by a replica.
+
+    A write inside the block sends the block's remaining reads to the primary.
+    """
+    token = _reads.set(REPLICA)
+    pinned_token = _pinned.set(_pinned.get())
+    try:
+        yield
+    finally:
+        _pinned.reset(pinned_token)
+        _reads.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Force reads in this block to the primary, e.g. when filling a shared cache."""
+    token = _reads.set(PRIMARY)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reads.get() != REPLICA or _pinned.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes for the rest of the request or use_replica()
+        # block; the middleware extends it to the client's next requests.
+        wrote = _wrote.get()
+        if wrote is not None or _reads.get() == REPLICA:
+            _pinned.set(True)
+        if wrote is not None:
+            wrote.append(model._meta.label)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication.
+        return not db.startswith(REPLICA_PREFIX)
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a client's reads to the primary for a while after it writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tokens = self._enter(request)
+        try:
+            return self._finish(self.get_response(request))
+        finally:
+            self._exit(tokens)
+
+    async def __acall__(self, request):
+        tokens = self._enter(request)
+        try:
+            return self._finish(await self.get_response(request))
+        finally:
+            self._exit(tokens)
+
+    def _enter(self, request):
+        try:
+            pinned = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return _pinned.set(pinned), _wrote.set([])
+
+    def _finish(self, response):
+        if _wrote.get():
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def _exit(self, tokens):
+        pinned_token, wrote_token = tokens
+        _wrote.reset(wrote_token)
+        _pinned.reset(pinned_token)
@@ -0,0 +1,101 @@
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test import Client
+from django.utils import timezone
+from availability.models import TimeSlot
+from bookings.models import Booking, NotificationOutbox
+from hms.db_router import STICKY_COOKIE, replica_aliases, use_replica
+
+PREFIX = 'routing-check-'
+EMAIL_DOMAIN = 'routing.invalid'
+
+
+class QueryAliases:
+    """execute_wrapper recording which database alias ran each query."""
+
+    def __init__(self):
+        self.aliases = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.aliases[context['connection'].alias] += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Exercise the primary/replica router through real requests and verify where each query ran. '
+        'Locally, point DATABASE_REPLICA_URLS at a copy of the primary, e.g. '
+        'cp /tmp/hms.db /tmp/replica.db; DATABASE_REPLICA_URLS=sqlite:////tmp/replica.db'
+    )
+
+    def handle(self, *args, **options):
+        if not replica_aliases():
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_URLS')
+        patient, slot = self.setup()
+        failures = 0
+        try:
+            client = Client()
+            # Cache misses are filled from the primary, so warm the cache first.
+            client.get('/')
+            failures += self.verify('anonymous index', 'replica', lambda: client.get('/'))
+            failures += self.verify('JSON slot listing', 'replica', lambda: client.get('/api/slots/?limit=5'))
+            client.force_login(patient)
+            # The session and user are always loaded from the primary.
+            failures += self.verify('patient dashboard', 'mixed', lambda: client.get('/users/patient/'))
+            failures += self.verify('create booking', 'primary', lambda: client.post(f'/bookings/create/{slot.pk}/'))
+            if STICKY_COOKIE not in client.cookies:
+                self.stdout.write(self.style.ERROR('booking response did not set the stickiness cookie'))
+                failures += 1
+            failures += self.verify('dashboard after write', 'primary', lambda: client.get('/users/patient/'))
+            client.cookies[STICKY_COOKIE] = str(time.time() - 1)
+            failures += self.verify('dashboard after window', 'mixed', lambda: client.get('/users/patient/'))
+
+            def write_in_replica_block():
+                with use_replica():
+                    TimeSlot.objects.filter(pk=slot.pk).exists()
+                    TimeSlot.objects.filter(pk=slot.pk).update(end=slot.end)
+                    TimeSlot.objects.filter(pk=slot.pk).exists()
+            failures += self.verify('read after write in block', 'replica-then-primary', write_in_replica_block)
+        finally:
+            self.teardown()
+        if failures:
+            raise CommandError(f'{failures} routing check(s) failed')
+        self.stdout.write(self.style.SUCCESS('Routing OK'))
+
+    def verify(self, name, expected, action):
+        recorder = QueryAliases()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            action()
+        aliases = recorder.aliases
+        on_primary = aliases.get(DEFAULT_DB_ALIAS, 0)
+        on_replicas = sum(n for alias, n in aliases.items() if alias != DEFAULT_DB_ALIAS)
+        ok = {
+            'replica': on_replicas > 0 and on_primary == 0,
+            'primary': on_primary > 0 and on_replicas == 0,
+            'mixed': on_replicas > 0,
+            'replica-then-primary': on_replicas == 1 and on_primary == 2,
+        }[expected]
+        line = f'{name:<28} expected {expected:<21} got {dict(aliases)}'
+        self.stdout.write(self.style.SUCCESS(line) if ok else self.style.ERROR(line))
+        return 0 if ok else 1
+
+    def setup(self):
+        from users.models import User
+        self.teardown()
+        doctor = User.objects.create(username=f'{PREFIX}doctor', role=User.DOCTOR, email=f'doctor@{EMAIL_DOMAIN}')
+        patient = User.objects.create(username=f'{PREFIX}patient', role=User.PATIENT, email=f'patient@{EMAIL_DOMAIN}')
+        start = timezone.now() + timedelta(days=365)
+        slot = TimeSlot.objects.create(doctor=doctor, start=start, end=start + timedelta(minutes=15))
+        return patient, slot
+
+    def teardown(self):
+        from users.models import User
+        Booking.objects.filter(patient__username__startswith=PREFIX).delete()
+        NotificationOutbox.objects.filter(to_email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
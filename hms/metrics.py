@@ -0,0 +1,267 @@
+"""In-process metrics (counters and histograms) exposed in Prometheus text format."""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_SECONDS = 1.0
+# A file not rewritten for this long belongs to a process that has exited.
+STALE_SECONDS = 10 * FLUSH_SECONDS
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def state(self):
+        return {
+            'kind': self.kind,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'values': [[list(key), list(value) if isinstance(value, list) else value] for key, value in self.values.items()],
+        }
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.registry.check_fork()
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.start_flusher()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            self.registry.check_fork()
+            # [count per bucket..., count above the last bucket, sum]
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+        self.registry.start_flusher()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def state(self):
+        return {**super().state(), 'buckets': list(self.buckets)}
+
+
+class Registry:
+    """Metrics of this process; with METRICS_DIR set, a background thread
+    writes them to `METRICS_DIR/<pid>-<start>.json` every FLUSH_SECONDS and
+    /metrics sums the files in the directory.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.metrics = {}
+        self._pid = os.getpid()
+        self._file = None
+        self._flusher_pid = None
+        atexit.register(self.flush)
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f'Metric {name} is already registered as a {metric.kind}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def check_fork(self):
+        """Start from zero in a forked child so the parent's counts are not reported twice."""
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._file = None
+            for metric in self.metrics.values():
+                metric.values = {}
+
+    def state(self):
+        with self.lock:
+            self.check_fork()
+            return {name: metric.state() for name, metric in self.metrics.items()}
+
+    def _path(self):
+        if self._file is None:
+            self._file = Path(self.directory) / f'{self._pid}-{time.time_ns()}.json'
+        return self._file
+
+    def start_flusher(self):
+        """Start this process's background flush thread, once (again in a forked child)."""
+        if self._flusher_pid == self._pid or not self.directory:
+            return
+        with self._flush_lock:
+            if self._flusher_pid != self._pid:
+                self._flusher_pid = self._pid
+                threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Write this process's metrics to METRICS_DIR (atomically replacing its file)."""
+        if not self.directory:
+            return
+        with self._flush_lock:
+            state = self.state()
+            path = self._path()
+            tmp = path.with_suffix('.tmp')
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp.write_text(json.dumps(state))
+                os.replace(tmp, path)
+            except OSError as exc:
+                logger.warning(f'Could not write metrics to {path}: {exc}')
+
+    def collect(self):
+        """Merged state of this process and, in multiprocess mode, every other one."""
+        if not self.directory:
+            return [self.state()]
+        self.flush()
+        states = []
+        stale = time.time() - STALE_SECONDS
+        for path in Path(self.directory).glob('*.json'):
+            try:
+                if path.stat().st_mtime < stale:
+                    path.unlink(missing_ok=True)
+                    continue
+                states.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # being replaced or removed
+        return states
+
+    def render(self):
+        return render_text(merge(self.collect()))
+
+
+def clear_directory():
+    """Remove every process's metrics file; call it when the server's master process starts."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        for path in Path(directory).glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+def mark_process_dead(pid):
+    """Drop an exited process's metrics file; call it from gunicorn's child_exit hook."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        for path in Path(directory).glob(f'{pid}-*.json'):
+            path.unlink(missing_ok=True)
+
+
+def merge(states):
+    """Sum per-process states into {name: state}."""
+    merged = {}
+    for state in states:
+        for name, metric in state.items():
+            target = merged.setdefault(name, {**metric, 'values': {}})
+            for key, value in metric['values']:
+                key = tuple(key)
+                current = target['values'].get(key)
+                if current is None:
+                    target['values'][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target['values'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['values'][key] = current + value
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def render_text(merged):
+    lines = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["kind"]}')
+        names = metric['labelnames']
+        for key, value in sorted(metric['values'].items()):
+            if metric['kind'] == 'counter':
+                lines.append(f'{name}{_labels(names, key)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(names, key, [("le", str(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(names, key)} {value[-1]}')
+            lines.append(f'{name}_count{_labels(names, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+counter = registry.counter
+histogram = registry.histogram
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for `Authorization: Bearer $METRICS_TOKEN` or a staff user."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    scraper = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not scraper and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
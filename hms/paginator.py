@@ -0,0 +1,35 @@
+"""Admin paginator that avoids an exact COUNT(*) on very large tables."""
+import json
+import logging
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+# Below this many estimated rows an exact count is cheap enough to run.
+EXACT_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is the PostgreSQL planner's row estimate for big result sets.
+
+    The estimate comes from EXPLAIN on the (possibly filtered) queryset,
+    so it reflects admin searches and filters too. Page links past the
+    real end simply come back empty. Other databases, and estimates under
+    EXACT_COUNT_THRESHOLD, get the exact count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'explain') and connections[queryset.db].vendor == 'postgresql':
+            try:
+                plan = json.loads(queryset.order_by().explain(format='json'))
+                estimate = int(plan[0]['Plan']['Plan Rows'])
+            except (DatabaseError, KeyError, IndexError, ValueError) as exc:
+                logger.warning(f'Falling back to an exact count: {exc}')
+            else:
+                if estimate >= EXACT_COUNT_THRESHOLD:
+                    return estimate
+        return super().count
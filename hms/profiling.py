@@ -0,0 +1,223 @@
+"""Opt-in per-request profiling (PROFILING) and per-view query budgets (@query_budget)."""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Repeated shapes reported per request, most frequent first.
+MAX_DUPLICATES = 5
+
+_current = contextvars.ContextVar('hms_profile', default=None)
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+_log_lock = threading.Lock()
+
+_IN_LIST = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_shape(sql):
+    """Collapse IN (...) lists so the same query with different ids has one shape."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = Counter()
+        self.template_seconds = 0.0
+        self.http_calls = 0
+        self.http_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+            self.shapes[query_shape(sql)] += 1
+
+    def duplicates(self):
+        return [(shape, n) for shape, n in self.shapes.most_common(MAX_DUPLICATES) if n > 1]
+
+    def server_timing(self, total_seconds):
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'http;dur={self.http_seconds * 1000:.1f};desc="{self.http_calls} calls"',
+            f'total;dur={total_seconds * 1000:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'duplicates': [{'count': n, 'sql': shape} for shape, n in self.duplicates()],
+            'template_ms': round(self.template_seconds * 1000, 2),
+            'http_calls': self.http_calls,
+            'http_ms': round(self.http_seconds * 1000, 2),
+        }
+
+
+def _timed(attribute, counter=None):
+    """Wrap a function (or coroutine function) so its wall time is added to the active profile's `attribute`."""
+    def record(profile, started):
+        setattr(profile, attribute, getattr(profile, attribute) + time.perf_counter() - started)
+        if counter:
+            setattr(profile, counter, getattr(profile, counter) + 1)
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profile = _current.get()
+                if profile is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(profile, started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(profile, started)
+        return wrapper
+    return decorator
+
+
+def install_hooks():
+    """Time template rendering and outbound HTTP calls; a no-op outside profiled requests.
+
+    HTTP is timed at each client's lowest shared layer: `requests` sessions,
+    httplib2 (Google Calendar) and httpx's sync and async transports.
+    """
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        from django.template.backends.django import Template
+        import httplib2
+        import httpx
+        import requests
+        Template.render = _timed('template_seconds')(Template.render)
+        http = _timed('http_seconds', 'http_calls')
+        requests.Session.send = http(requests.Session.send)
+        httplib2.Http.request = http(httplib2.Http.request)
+        httpx.HTTPTransport.handle_request = http(httpx.HTTPTransport.handle_request)
+        httpx.AsyncHTTPTransport.handle_async_request = http(httpx.AsyncHTTPTransport.handle_async_request)
+        _hooks_installed = True
+
+
+class _Recording:
+    """Install `profile` as the active profile and as execute_wrapper on every connection."""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def __enter__(self):
+        self.token = _current.set(self.profile)
+        self.wrappers = [conn.execute_wrapper(self.profile) for conn in connections.all()]
+        for wrapper in self.wrappers:
+            wrapper.__enter__()
+        return self.profile
+
+    def __exit__(self, *exc):
+        for wrapper in reversed(self.wrappers):
+            wrapper.__exit__(*exc)
+        _current.reset(self.token)
+
+
+def write_sample(record, path=None):
+    path = path or settings.PROFILING_LOG
+    line = json.dumps(record, default=str)
+    with _log_lock, open(path, 'a') as fh:
+        fh.write(line + '\n')
+
+
+class ProfilingMiddleware:
+    """Add Server-Timing to every response and log a sample of request profiles."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_hooks()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        with _Recording(profile):
+            response = self.get_response(request)
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            match = getattr(request, 'resolver_match', None)
+            write_sample({
+                'ts': time.time(),
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                **profile.as_dict(),
+            })
+        return response
+
+
+def query_budget(limit):
+    """Declare the most SQL queries a view may run (middleware and auth excluded).
+
+    Checked only with PROFILING or PROFILING_STRICT on: exceeding it raises
+    QueryBudgetExceeded when strict and logs the repeated query shapes
+    otherwise.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not (settings.PROFILING or settings.PROFILING_STRICT):
+                return view(request, *args, **kwargs)
+            outer = _current.get()
+            profile = RequestProfile()
+            with _Recording(profile):
+                response = view(request, *args, **kwargs)
+            if outer is not None:
+                # Queries also reached the middleware's execute_wrapper, but
+                # template and HTTP time only went to the innermost profile.
+                outer.template_seconds += profile.template_seconds
+                outer.http_calls += profile.http_calls
+                outer.http_seconds += profile.http_seconds
+            if profile.queries > limit:
+                message = (
+                    f'{view.__module__}.{view.__name__} ran {profile.queries} queries '
+                    f'(budget {limit}); repeated: {profile.duplicates()}'
+                )
+                if settings.PROFILING_STRICT:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
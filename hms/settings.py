@@ -22,10 +22,13 @@ INSTALLED_APPS = [
     'availability',
     'bookings',
     'calendar_integration',
+    # Project-wide management commands (hms/management/commands).
+    'hms',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'hms.db_router.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -34,6 +37,25 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in request profiling (hms/profiling.py): Server-Timing headers, a
+# sampled JSONL log, and warnings for views over their @query_budget.
+# PROFILING_STRICT checks the budgets (without the middleware) and turns
+# exceeding one into an error; enable it in CI. With both off, budgets are
+# not checked at all.
+PROFILING = os.getenv('PROFILING', 'False') == 'True'
+PROFILING_STRICT = os.getenv('PROFILING_STRICT', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.1'))
+PROFILING_LOG = os.getenv('PROFILING_LOG', str(BASE_DIR / 'profiling.jsonl'))
+if PROFILING:
+    MIDDLEWARE.insert(0, 'hms.profiling.ProfilingMiddleware')
+
+# Metrics (hms/metrics.py). Set METRICS_DIR to a directory shared by all
+# worker processes so /metrics reports their sum (gunicorn.conf.py drops
+# the files of exited workers). /metrics answers staff users, and scrapers
+# sending METRICS_TOKEN as a bearer token.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 ROOT_URLCONF = 'hms.urls'
 
 TEMPLATES = [
@@ -53,6 +75,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'hms.wsgi.application'
+ASGI_APPLICATION = 'hms.asgi.application'
+# Serve index, signup and create_booking with their async views; use with
+# an ASGI server (e.g. `uvicorn hms.asgi:application`).
+HMS_ASYNC_VIEWS = os.getenv('HMS_ASYNC_VIEWS', 'False') == 'True'
 
 # Database
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -71,6 +97,49 @@ else:
         }
     }
 
+# Persistent, health-checked connections instead of one connection per request.
+CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+for _db in DATABASES.values():
+    _db['CONN_MAX_AGE'] = CONN_MAX_AGE
+    _db['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas (comma-separated URLs) become replica_0, replica_1, ... and
+# serve reads inside hms.db_router.use_replica(); a client that wrote reads
+# from the primary for REPLICA_STICKY_SECONDS afterwards.
+DATABASE_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+for _index, _url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{_index}'] = {
+        **dj_database_url.parse(_url.strip(), conn_max_age=CONN_MAX_AGE, conn_health_checks=True),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['hms.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Cache: Redis (shared by all workers) when REDIS_URL is set, a shared
+# directory when CACHE_DIR is set, otherwise per-process local memory.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_DIR = os.getenv('CACHE_DIR')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+elif CACHE_DIR:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': CACHE_DIR}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'hms'}}
+
+# How long a doctor's free-slot list is cached (availability/cache.py).
+# Bookings bump the doctor's version in the cache; with the local-memory
+# default that bump is seen only by the process that made it, and other
+# workers keep serving their copy until it expires, so the lifetime is
+# kept short unless the cache is shared.
+AVAILABILITY_CACHE_SECONDS = int(os.getenv('AVAILABILITY_CACHE_SECONDS', '300' if REDIS_URL or CACHE_DIR else '30'))
+
+# Booking admission control (bookings/admission.py): per-doctor concurrency
+# caps and a virtual queue for surges. Its counters need a cache shared by
+# every worker with atomic incr (the local-memory cache is per process and
+# the file cache's incr is not atomic), so it is on by default only with
+# REDIS_URL.
+BOOKING_ADMISSION = os.getenv('BOOKING_ADMISSION', 'True' if REDIS_URL else 'False') == 'True'
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+import httplib2
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from availability.models import TimeSlot
+from users.models import User
+from .db_router import STICKY_COOKIE, ReplicaRouter, use_primary, use_replica
+from .metrics import FLUSH_SECONDS, STALE_SECONDS, Registry, clear_directory, mark_process_dead
+from .profiling import RequestProfile, _Recording, install_hooks
+
+
+class MetricsViewTests(TestCase):
+    def test_anonymous_scrape_is_refused(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_or_staff_may_scrape(self):
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'}).status_code, 200)
+        self.client.force_login(User.objects.create(username='ops', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class MetricsDirectoryTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(METRICS_DIR=self.directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        # Flusher threads are run by hand, not started.
+        patcher = mock.patch('hms.metrics.threading.Thread')
+        self.thread = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def files(self):
+        return list(Path(self.directory.name).glob('*.json'))
+
+    def test_recording_does_not_write_and_the_flusher_does(self):
+        registry = Registry()
+        registry.counter('hms_test_total', 'Test counter').inc()
+        self.assertEqual(self.files(), [])
+        self.thread.return_value.start.assert_called_once()
+
+        # One pass of the flush loop, stopped at its next wait.
+        flush_forever = self.thread.call_args.kwargs['target']
+        with mock.patch('hms.metrics.time.sleep', side_effect=[None, StopIteration]) as sleep:
+            with self.assertRaises(StopIteration):
+                flush_forever()
+        sleep.assert_called_with(FLUSH_SECONDS)
+        path, = self.files()
+        self.assertEqual(json.loads(path.read_text())['hms_test_total']['values'], [[[], 1]])
+
+    def test_dead_process_files_are_dropped(self):
+        registry = Registry()
+        registry.counter('hms_test_total', 'Test counter').inc()
+        registry.flush()
+        Path(self.directory.name, '999999-1.json').write_text('{}')
+        mark_process_dead(999999)
+        self.assertEqual([p.name.split('-')[0] for p in self.files()], [str(os.getpid())])
+
+    def test_stale_files_are_dropped_and_directory_cleared_on_start(self):
+        registry = Registry()
+        registry.counter('hms_test_total', 'Test counter').inc()
+        stale = Path(self.directory.name, '999999-1.json')
+        stale.write_text(json.dumps(registry.state()))
+        old = time.time() - STALE_SECONDS - 1
+        os.utime(stale, (old, old))
+        self.assertIn('hms_test_total 1', registry.render())
+        self.assertFalse(stale.exists())
+
+        clear_directory()
+        self.assertEqual(self.files(), [])
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class ProfilingHooksTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/'
+        install_hooks()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_http_clients_are_timed(self):
+        async def async_get():
+            async with httpx.AsyncClient() as client:
+                return (await client.get(self.url)).status_code
+
+        with _Recording(RequestProfile()) as profile:
+            self.assertEqual(requests.get(self.url).status_code, 200)
+            self.assertEqual(httplib2.Http().request(self.url)[0].status, 200)
+            self.assertEqual(httpx.get(self.url).status_code, 200)
+            self.assertEqual(async_to_sync(async_get)(), 200)
+        self.assertEqual(profile.http_calls, 4)
+        self.assertGreater(profile.http_seconds, 0)
+
+
+@mock.patch('hms.db_router.replica_aliases', lambda: ['replica_0'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_a_replica_only_inside_use_replica(self):
+        self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(TimeSlot), 'replica_0')
+            self.assertEqual(self.router.db_for_read(User._meta.apps.get_model('sessions', 'Session')), 'default')
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+
+    def test_a_write_pins_the_rest_of_the_block(self):
+        with use_replica():
+            self.router.db_for_write(TimeSlot)
+            self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(TimeSlot), 'replica_0')
+
+    def test_writing_request_sets_sticky_cookie(self):
+        patient = User.objects.create(username='pat', role=User.PATIENT)
+        self.client.force_login(patient)
+        response = self.client.post(reverse('users:logout'))
+        self.assertIn(STICKY_COOKIE, response.cookies)
@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from hms.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('users/', include('users.urls')),
     path('bookings/', include('bookings.urls')),
     path('calendar/', include('calendar_integration.urls')),
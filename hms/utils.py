@@ -0,0 +1,8 @@
+import random
+from datetime import timedelta
+
+
+def backoff_delay(attempts, base_seconds=5, max_seconds=3600):
+    """Exponential backoff with jitter for the given attempt number (1-based)."""
+    delay = min(max_seconds, base_seconds * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
@@ -0,0 +1,78 @@
+"""Local throughput benchmark for handler.send_email against an aiosmtpd stand-in.
+
+    pip install aiosmtpd
+    python bench.py --messages 500
+
+Compares one invocation per message with a fresh SMTP session (the old
+behaviour), one invocation per message reusing the warm session, and a
+single batch invocation.
+"""
+import argparse
+import json
+import os
+import time
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    raise SystemExit('bench.py needs aiosmtpd: pip install aiosmtpd')
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+def message(i):
+    return {'action': 'BENCH', 'to': f'user{i}@example.com', 'subject': 'bench', 'body': 'hello'}
+
+
+def run(label, n, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<28} {n:>6} msgs  {elapsed:8.3f}s  {n / elapsed:10.1f} msg/s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    smtp_handler = CountingHandler()
+    controller = Controller(smtp_handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    os.environ.update({'SMTP_HOST': '127.0.0.1', 'SMTP_PORT': str(args.port), 'SMTP_STARTTLS': 'False'})
+    os.environ.pop('SMTP_USER', None)
+    import handler
+
+    n = args.messages
+    try:
+        def cold_single():
+            for i in range(n):
+                handler._close()
+                handler.send_email({'body': json.dumps(message(i))}, None)
+
+        def warm_single():
+            for i in range(n):
+                handler.send_email({'body': json.dumps(message(i))}, None)
+
+        def batch():
+            handler.send_email({'body': json.dumps({'messages': [message(i) for i in range(n)]})}, None)
+
+        run('single, new connection', n, cold_single)
+        run('single, warm connection', n, warm_single)
+        run('batch, one session', n, batch)
+        handler._close()
+    finally:
+        controller.stop()
+    print(f'server received {smtp_handler.received} messages')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,16 +7,81 @@ SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
 SMTP_USER = os.getenv('SMTP_USER')
 SMTP_PASS = os.getenv('SMTP_PASS')
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'True') == 'True'
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '10'))
+
+# Authenticated SMTP session kept across warm Lambda invocations.
+_smtp = None
+
+
+def _connect():
+    smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    smtp.ehlo()
+    if SMTP_STARTTLS:
+        smtp.starttls()
+        smtp.ehlo()
+    if SMTP_USER:
+        smtp.login(SMTP_USER, SMTP_PASS)
+    return smtp
+
+
+def _close():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    _smtp = None
+
+
+def _send(msg):
+    """Send over the shared session, reconnecting once if the server dropped it."""
+    global _smtp
+    if _smtp is None:
+        _smtp = _connect()
+    try:
+        _smtp.send_message(msg)
+    except (smtplib.SMTPServerDisconnected, ConnectionError):
+        _close()
+        _smtp = _connect()
+        _smtp.send_message(msg)
+
+
+def _build_message(data):
+    action = data.get('action')
+    msg = EmailMessage()
+    msg['Subject'] = data.get('subject') or f'HMS: {action}'
+    msg['From'] = SMTP_USER
+    msg['To'] = data.get('to')
+    msg.set_content(data.get('body') or '')
+    return msg
+
+
+def _batch_response(sent, failed, unsent=(), error=None):
+    if not failed and not unsent:
+        status_code, status = 200, 'sent'
+    elif sent:
+        status_code, status = 207, 'partial'
+    else:
+        status_code, status = 500, 'failed'
+    result = {'status': status, 'sent': sent, 'failed': failed, 'unsent': list(unsent)}
+    if error is not None:
+        result['error'] = error
+    return {'statusCode': status_code, 'body': json.dumps(result)}
 
 
 def send_email(event, context):
     """Lambda handler for sending emails.
-    
+
     Expects a JSON body with keys:
       - action: SIGNUP_WELCOME | BOOKING_CONFIRMATION
       - to: recipient email
       - subject: optional subject
       - body: optional HTML/text body
+
+    or, in batch mode, `{"messages": [{...}, ...]}` with the same keys per
+    message, all sent over one authenticated SMTP session.
     """
     try:
         body = event.get('body')
@@ -25,23 +90,27 @@ def send_email(event, context):
         else:
             data = body or {}
 
-        action = data.get('action')
-        to = data.get('to')
-        subject = data.get('subject') or f'HMS: {action}'
-        content = data.get('body') or ''
-
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = SMTP_USER
-        msg['To'] = to
-        msg.set_content(content)
-
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.ehlo()
-            smtp.starttls()
-            smtp.login(SMTP_USER, SMTP_PASS)
-            smtp.send_message(msg)
+        if 'messages' not in data:
+            _send(_build_message(data))
+            return {'statusCode': 200, 'body': json.dumps({'status': 'sent'})}
 
-        return {'statusCode': 200, 'body': json.dumps({'status': 'sent'})}
+        messages = data['messages']
+        sent, failed = [], []
+        for index, item in enumerate(messages):
+            try:
+                _send(_build_message(item))
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, ValueError) as e:
+                # Per-message rejection; the session is still usable.
+                failed.append({'index': index, 'error': str(e)})
+            except Exception as e:
+                # The session is gone (reconnect failed, timeout): stop, and
+                # say which messages went out so the caller retries the rest.
+                _close()
+                failed.append({'index': index, 'error': str(e)})
+                return _batch_response(sent, failed, unsent=list(range(index + 1, len(messages))), error=str(e))
+            else:
+                sent.append(index)
+        return _batch_response(sent, failed)
     except Exception as e:
+        _close()
         return {'statusCode': 500, 'body': json.dumps({'error': str(e)})}
@@ -0,0 +1,96 @@
+import json
+import smtplib
+import socket
+import unittest
+from unittest import mock
+
+import handler
+
+
+class FakeSMTP:
+    """SMTP session that raises the queued error, if any, for each message it is given."""
+
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.sent = []
+        self.calls = 0
+
+    def send_message(self, msg):
+        error = self.errors.pop(self.calls, None)
+        self.calls += 1
+        if error is not None:
+            raise error
+        self.sent.append(msg['To'])
+
+    def quit(self):
+        pass
+
+
+def batch(n):
+    return {'body': json.dumps({'messages': [{'action': 'TEST', 'to': f'user{i}@example.com'} for i in range(n)]})}
+
+
+class SendEmailTests(unittest.TestCase):
+    def setUp(self):
+        handler._close()
+        self.sessions = []
+
+    def tearDown(self):
+        handler._close()
+
+    def connect(self, *errors):
+        """Patch _connect to hand out one FakeSMTP per call, raising errors[n] for its nth message."""
+        def connect():
+            smtp = FakeSMTP(errors[len(self.sessions)] if len(self.sessions) < len(errors) else None)
+            self.sessions.append(smtp)
+            return smtp
+        return mock.patch.object(handler, '_connect', connect)
+
+    def call(self, event):
+        response = handler.send_email(event, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_batch_is_sent_over_one_session(self):
+        with self.connect():
+            status, body = self.call(batch(3))
+        self.assertEqual(status, 200)
+        self.assertEqual(body, {'status': 'sent', 'sent': [0, 1, 2], 'failed': [], 'unsent': []})
+        self.assertEqual(len(self.sessions), 1)
+
+    def test_rejected_messages_are_reported_by_index(self):
+        refused = smtplib.SMTPRecipientsRefused({'user1@example.com': (550, b'no such user')})
+        with self.connect({1: refused}):
+            status, body = self.call(batch(3))
+        self.assertEqual(status, 207)
+        self.assertEqual(body['status'], 'partial')
+        self.assertEqual(body['sent'], [0, 2])
+        self.assertEqual([f['index'] for f in body['failed']], [1])
+        self.assertEqual(len(self.sessions), 1)
+
+    def test_dropped_session_is_reconnected(self):
+        with self.connect({1: smtplib.SMTPServerDisconnected('gone')}):
+            status, body = self.call(batch(3))
+        self.assertEqual(status, 200)
+        self.assertEqual(body['sent'], [0, 1, 2])
+        self.assertEqual(len(self.sessions), 2)
+        self.assertEqual(self.sessions[1].sent, ['user1@example.com', 'user2@example.com'])
+
+    def test_lost_session_reports_what_was_sent(self):
+        disconnected = smtplib.SMTPServerDisconnected('gone')
+        with self.connect({1: disconnected}, {0: socket.timeout('timed out')}):
+            status, body = self.call(batch(4))
+        self.assertEqual(status, 207)
+        self.assertEqual(body['sent'], [0])
+        self.assertEqual(body['failed'], [{'index': 1, 'error': 'timed out'}])
+        self.assertEqual(body['unsent'], [2, 3])
+        self.assertEqual(body['error'], 'timed out')
+        self.assertIsNone(handler._smtp)
+
+    def test_single_message(self):
+        with self.connect():
+            status, body = self.call({'body': {'action': 'TEST', 'to': 'a@example.com'}})
+        self.assertEqual((status, body), (200, {'status': 'sent'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
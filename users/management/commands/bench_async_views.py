@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+from bookings import utils as notification_utils
+from bookings.management.commands.booking_loadtest import percentile
+from users import views
+
+PREFIX = 'asyncbench-'
+
+
+def slow_email_server(delay):
+    """Threaded HTTP server standing in for the email endpoint; every POST takes `delay` seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay)
+            body = b'{"status": "sent"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024  # the default backlog of 5 refuses bursts
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare signup throughput of the sync view (a pool of WSGI-style worker threads) with the async view '
+        '(one event loop) while the email endpoint is artificially slow.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Signups per mode')
+        parser.add_argument('--email-delay', type=float, default=0.2, help='Seconds the email stand-in takes per call')
+        parser.add_argument('--workers', type=int, default=4, help='Threads for the sync view, like WSGI workers')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight for the async view')
+
+    def handle(self, *args, **options):
+        server = slow_email_server(options['email_delay'])
+        notification_utils._client = notification_utils.NotificationClient(
+            url=f'http://127.0.0.1:{server.server_port}/send',
+        )
+        notification_utils._async_clients.clear()
+        urlconf = types.ModuleType('bench_urls')
+        urlconf.urlpatterns = [
+            path('bench/sync/', views.signup_view),
+            path('bench/async/', views.signup_view_async),
+            path('', include('hms.urls')),
+        ]
+        # Cheap hashing so the comparison measures waiting, not PBKDF2.
+        hashers = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        try:
+            with override_settings(ROOT_URLCONF=urlconf, PASSWORD_HASHERS=hashers):
+                self.teardown()
+                self.report('sync', *self.run_sync(options))
+                self.report('async', *asyncio.run(self.run_async(options)))
+        finally:
+            self.teardown()
+            server.shutdown()
+
+    def signup_data(self, n, mode):
+        password = 'Xq7!vLr2#pZ9-kT'
+        return {
+            'username': f'{PREFIX}{mode}-{n}',
+            'email': f'{mode}-{n}@bench.invalid',
+            'first_name': 'Load',
+            'last_name': 'Test',
+            'role': 'patient',
+            'password1': password,
+            'password2': password,
+        }
+
+    def run_sync(self, options):
+        def one(n):
+            started = time.perf_counter()
+            response = Client().post('/bench/sync/', self.signup_data(n, 'sync'))
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(one, range(options['requests'])))
+        return time.perf_counter() - started, results
+
+    async def run_async(self, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def one(n):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await AsyncClient().post('/bench/async/', self.signup_data(n, 'async'))
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(n) for n in range(options['requests'])))
+        return time.perf_counter() - started, results
+
+    def report(self, mode, wall, results):
+        latencies = [latency for latency, _ in results]
+        redirected = sum(1 for _, status in results if status == 302)
+        emails = notification_utils.get_notification_client().stats.snapshot()
+        notification_utils.get_notification_client().stats.reset()
+        self.stdout.write(
+            f'{mode:<6} requests={len(results)} ok={redirected} wall={wall:.2f}s '
+            f'throughput={len(results) / wall:.1f} req/s '
+            f'p50={percentile(latencies, 50) * 1000:.0f}ms p95={percentile(latencies, 95) * 1000:.0f}ms '
+            f"email_errors={emails['errors'] + emails['short_circuited']}"
+        )
+
+    def teardown(self):
+        from users.models import User
+        User.objects.filter(username__startswith=PREFIX).delete()
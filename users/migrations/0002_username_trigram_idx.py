@@ -0,0 +1,35 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Admin search_fields use icontains, which PostgreSQL runs as
+# UPPER("users_user"."username"::text) LIKE UPPER('%term%'); a trigram
+# index on that same expression serves it instead of a sequential scan.
+INDEX_NAME = 'user_username_upper_trgm_idx'
+
+
+def add_trigram_index(apps, schema_editor):
+    # SQLite has no pg_trgm; searches there stay sequential scans.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON users_user '
+        'USING gin ((UPPER("username"::text)) gin_trgm_ops)'
+    )
+
+
+def remove_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_trigram_index, remove_trigram_index),
+    ]
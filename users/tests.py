@@ -0,0 +1,36 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from availability.models import TimeSlot
+from availability.summary import rebuild
+from bookings.models import Booking
+from .models import User
+
+
+@override_settings(PROFILING_STRICT=True)
+class DashboardQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now() + timedelta(days=1)
+        cls.doctor = User.objects.create(username='doc', role=User.DOCTOR)
+        cls.patients = [User.objects.create(username=f'pat{n}', role=User.PATIENT) for n in range(5)]
+        slots = TimeSlot.objects.bulk_create([
+            TimeSlot(doctor=cls.doctor, start=start + timedelta(hours=n), end=start + timedelta(hours=n, minutes=30))
+            for n in range(15)
+        ])
+        for slot, patient in zip(slots, cls.patients * 2):
+            Booking.create_for_slot(slot.pk, patient)
+        rebuild([cls.doctor.pk])
+
+    def test_doctor_dashboard(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('users:doctor_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['recent_bookings']), 10)
+
+    def test_patient_dashboard(self):
+        self.client.force_login(self.patients[0])
+        response = self.client.get(reverse('users:patient_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['my_bookings']), 2)
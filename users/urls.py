@@ -1,10 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'users'
 
 urlpatterns = [
-    path('signup/', views.signup_view, name='signup'),
+    path('signup/', views.signup_view_async if settings.HMS_ASYNC_VIEWS else views.signup_view, name='signup'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('doctor/', views.doctor_dashboard, name='doctor_dashboard'),
@@ -1,29 +1,36 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout
+from django.contrib.auth import alogin, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from bookings.utils import asend_email_notification, send_email_notification
+from hms.db_router import use_replica
+from hms.profiling import query_budget
 from .forms import SignUpForm, LoginForm
-import os
-import requests
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _signup_message(user):
+    subject = f'Welcome to HMS - {user.get_full_name()}'
+    body = f'Hi {user.first_name},\n\nWelcome to the Hospital Management System!\n\nYou signed up as a {user.get_role_display()}.\n\nBest regards,\nHMS Team'
+    return subject, body
+
+
 def send_signup_email(user):
-    """Send welcome email to new user via serverless endpoint."""
-    try:
-        url = os.getenv('SERVERLESS_EMAIL_URL', 'http://localhost:3000/send')
-        payload = {
-            'action': 'SIGNUP_WELCOME',
-            'to': user.email,
-            'subject': f'Welcome to HMS - {user.get_full_name()}',
-            'body': f'Hi {user.first_name},\\n\\nWelcome to the Hospital Management System!\\n\\nYou signed up as a {user.get_role_display()}.\\n\\nBest regards,\\nHMS Team'
-        }
-        resp = requests.post(url, json=payload, timeout=5)
-        resp.raise_for_status()
-    except Exception as e:
-        logger.warning(f'Failed to send signup email: {e}')
+    """Send welcome email to new user via the shared notification client."""
+    subject, body = _signup_message(user)
+    result = send_email_notification('SIGNUP_WELCOME', user.email, subject=subject, body=body)
+    if 'error' in result:
+        logger.warning(f'Failed to send signup email: {result["error"]}')
+
+
+async def asend_signup_email(user):
+    subject, body = _signup_message(user)
+    result = await asend_email_notification('SIGNUP_WELCOME', user.email, subject=subject, body=body)
+    if 'error' in result:
+        logger.warning(f'Failed to send signup email: {result["error"]}')
 
 
 def signup_view(request):
@@ -41,6 +48,29 @@ def signup_view(request):
     return render(request, 'users/signup.html', {'form': form})
 
 
+def _save_signup(form):
+    return form.save() if form.is_valid() else None
+
+
+async def signup_view_async(request):
+    """signup_view for ASGI: the welcome email is awaited without holding a thread.
+
+    Validation and saving (unique checks, password hashing) still run in
+    a worker thread.
+    """
+    if request.method == 'POST':
+        form = SignUpForm(request.POST)
+        user = await sync_to_async(_save_signup)(form)
+        if user is not None:
+            await alogin(request, user)
+            await asend_signup_email(user)
+            messages.success(request, 'Signup successful')
+            return redirect('/')
+    else:
+        form = SignUpForm()
+    return await sync_to_async(render)(request, 'users/signup.html', {'form': form})
+
+
 def login_view(request):
     if request.method == 'POST':
         form = LoginForm(request, data=request.POST)
@@ -60,29 +90,43 @@ def logout_view(request):
 
 
 @login_required
+@use_replica()
+@query_budget(3)
 def doctor_dashboard(request):
     user = request.user
     if not user.is_doctor():
         messages.error(request, 'Only doctors can access this page')
         return redirect('availability_index')
     from availability.models import TimeSlot
+    from availability.summary import utilization_trend
     from bookings.models import Booking
     slots = TimeSlot.objects.filter(doctor=user).order_by('start')[:10]
-    recent_bookings = Booking.objects.filter(slot__doctor=user).order_by('-created_at')[:10]
+    recent_bookings = (
+        Booking.objects.filter(slot__doctor=user)
+        .select_related('slot', 'patient')
+        .order_by('-created_at')[:10]
+    )
     return render(request, 'users/doctor_dashboard.html', {
         'slots': slots,
         'recent_bookings': recent_bookings,
+        'trend': utilization_trend(user),
     })
 
 
 @login_required
+@use_replica()
+@query_budget(1)
 def patient_dashboard(request):
     user = request.user
     if not user.is_patient():
         messages.error(request, 'Only patients can access this page')
         return redirect('availability_index')
     from bookings.models import Booking
-    my_bookings = Booking.objects.filter(patient=user).order_by('-created_at')[:10]
+    my_bookings = (
+        Booking.objects.filter(patient=user)
+        .select_related('slot__doctor')
+        .order_by('-created_at')[:10]
+    )
     return render(request, 'users/patient_dashboard.html', {
         'my_bookings': my_bookings,
     })